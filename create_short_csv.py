@@ -1,30 +1,34 @@
-import csv
+import argparse
+import os
 import sys
 from pathlib import Path
 
-def create_short_csv(input_file, output_file=None, num_lines=100):
+# Shared helpers in scripts/utils
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'utils'))
+from csv_sampling import METHODS, sample_csv
+
+def create_short_csv(input_file, output_file=None, num_lines=100, method='head', key=None, seed=None, max_keys=None):
     """
-    Copy the header and first num_lines rows from input_file to output_file.
+    Copy the header and num_lines sampled rows from input_file to output_file.
+    The default 'head' method takes the first rows; see csv_sampling for 'reservoir' and 'stratified'
+    (num_lines rows per key value).
     If output_file is None, create a file with _short suffix.
     """
     if output_file is None:
         path = Path(input_file)
         output_file = str(path.parent / f"{path.stem}_short{path.suffix}")
-    with open(input_file, 'r', encoding='utf-8') as infile, \
-         open(output_file, 'w', encoding='utf-8', newline='') as outfile:
-        reader = csv.reader(infile)
-        writer = csv.writer(outfile)
-        for i, row in enumerate(reader):
-            writer.writerow(row)
-            if i == num_lines:
-                break
+    sample_csv(input_file, output_file, num_lines, method=method, key=key, seed=seed, max_keys=max_keys)
     print(f"Short CSV saved to: {output_file}")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python create_short_csv.py input.csv [output.csv] [num_lines]")
-        sys.exit(1)
-    input_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else None
-    num_lines = int(sys.argv[3]) if len(sys.argv) > 3 else 100
-    create_short_csv(input_file, output_file, num_lines)
+    parser = argparse.ArgumentParser(usage="python create_short_csv.py input.csv [output.csv] [num_lines] "
+                                           "[--method {head,reservoir,stratified}] [--key COLUMN] [--max-keys N] [--seed N]")
+    parser.add_argument('input_file')
+    parser.add_argument('output_file', nargs='?', default=None)
+    parser.add_argument('num_lines', nargs='?', type=int, default=100)
+    parser.add_argument('--method', choices=METHODS, default='head', help='Sampling method (default: head)')
+    parser.add_argument('--key', default=None, help='Column to stratify by, e.g. Symbol or OwnerID (stratified only)')
+    parser.add_argument('--max-keys', type=int, default=None, help='Keep at most this many random key values (stratified only)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for reservoir and stratified sampling')
+    args = parser.parse_args()
+    create_short_csv(args.input_file, args.output_file, args.num_lines, args.method, args.key, args.seed, args.max_keys)
@@ -0,0 +1,146 @@
+"""
+crowdalpha.py
+-------------
+Single entry point for the CrowdAlpha tools: `python crowdalpha.py <command> [args...]`.
+Each command runs an existing script in this process with the remaining arguments, exactly
+as if it were invoked directly. Only that script's modules are imported, so dispatch costs
+no more than the script itself; this file imports nothing beyond the standard library.
+
+--profile-imports re-runs the command under `python -X importtime` and prints the slowest
+imports. `check-startup` measures start-up time against STARTUP_BUDGETS_MS.
+"""
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# command -> (script relative to the repository root, description)
+COMMANDS = {
+    'tickers': ('scripts/ticker parser/ticker_parser.py', 'Write the symbols of a ticker JSON file to CSV'),
+    'cashtags': ('scripts/ticker parser/extract_cashtags.py', 'Extract and validate cashtags from raw posts'),
+    'validate-csv': ('sentiment-analyzer-v2/check_csv_fields.py', 'Check the field count of every CSV record'),
+    'prices': ('scripts/historical prices/get_historical_prices.py', 'Download historical prices'),
+    'gains': ('scripts/symbol daily gains/calculate_daily_gains.py', 'Compute daily gains and the price store'),
+    'sentiments': ('scripts/process sentiments/process_sentiments.py', 'Spread analyzed sentiments over trading days'),
+    'dataset': ('scripts/build ml dataset/build_ml_dataset.py', 'Join sentiments with daily gains'),
+    'pipeline': ('scripts/pipeline/run_pipeline.py', 'Run the whole pipeline, skipping unchanged stages'),
+    'portfolio': ('ml/modular_portfolio/main.py', 'Simulate and optimize the sentiment portfolio'),
+    'compare': ('ml/visualize/compare_portfolio_metrics.py', 'Compare weight vectors against the SPX index'),
+    'sample': ('create_short_csv.py', 'Write a head, reservoir or stratified sample of a CSV'),
+    'samples': ('scripts/generate samples/generate_csv_samples.py', 'Regenerate data/samples'),
+    'benchmarks': ('scripts/benchmarks/run_benchmarks.py', 'Run the performance benchmarks'),
+}
+
+# Wall-clock budgets (ms, best of several runs) for start-up paths that must stay light: the
+# top-level usage and every command's --help. Python itself takes roughly 20-40 ms of each.
+STARTUP_BUDGETS_MS = {
+    ('--help',): 150,
+    **{(name, '--help'): 200 for name in COMMANDS},
+}
+# Modules a start-up path listed in STARTUP_BUDGETS_MS should never import
+HEAVY_MODULES = ('numpy', 'pandas', 'scipy', 'matplotlib', 'requests')
+
+def usage():
+    width = max(len(name) for name in list(COMMANDS) + ['check-startup'])
+    lines = [
+        'usage: python crowdalpha.py [--profile-imports] <command> [args...]',
+        '',
+        'commands:',
+    ]
+    lines += [f'  {name:<{width}}  {description}' for name, (_, description) in COMMANDS.items()]
+    lines += [
+        f"  {'check-startup':<{width}}  Measure start-up time against the budgets",
+        '',
+        'Run `python crowdalpha.py <command> --help` for the options of a command.',
+        '--profile-imports runs the command under `python -X importtime` and lists the slowest imports.',
+    ]
+    return '\n'.join(lines)
+
+def run_command(name, args):
+    """Run a command's script as __main__ with args, from its own directory on sys.path."""
+    import runpy
+    script = os.path.join(ROOT_DIR, COMMANDS[name][0])
+    sys.argv = [script] + list(args)
+    sys.path.insert(0, os.path.dirname(script))
+    runpy.run_path(script, run_name='__main__')
+
+def parse_importtime(stderr):
+    """
+    Split `-X importtime` stderr into (imports, other lines). imports holds
+    (module, self_us, cumulative_us, depth) for each imported module.
+    """
+    imports, other = [], []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            other.append(line)
+            continue
+        if 'imported package' in line:
+            continue  # column header
+        self_us, cumulative_us, module = line[len('import time:'):].split('|', 2)
+        name = module.rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports, other
+
+def profile_imports(args, top=15):
+    """Run crowdalpha with args under -X importtime and report the slowest top-level imports."""
+    import subprocess
+    result = subprocess.run([sys.executable, '-X', 'importtime', os.path.abspath(__file__)] + list(args),
+                            stderr=subprocess.PIPE, text=True)
+    imports, other = parse_importtime(result.stderr)
+    for line in other:
+        print(line, file=sys.stderr)
+    # Depth 0 entries are imported by a script directly, so their cumulative times do not overlap
+    top_level = sorted((i for i in imports if i[3] == 0), key=lambda i: i[2], reverse=True)
+    total_ms = sum(i[2] for i in top_level) / 1000
+    print(f'\nImport time: {total_ms:.0f} ms in {len(imports)} modules. Slowest top-level imports:', file=sys.stderr)
+    for module, _, cumulative_us, _ in top_level[:top]:
+        print(f'  {cumulative_us / 1000:8.1f} ms  {module}', file=sys.stderr)
+    return result.returncode
+
+def check_startup(args):
+    """Time each STARTUP_BUDGETS_MS path and flag heavy imports. Returns 1 if any path is over budget."""
+    import argparse
+    import subprocess
+    import time
+    parser = argparse.ArgumentParser(prog='crowdalpha.py check-startup', description='Measure start-up time against the budgets')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per path; the fastest counts (default: 5)')
+    options = parser.parse_args(args)
+
+    failed = False
+    for command, budget_ms in STARTUP_BUDGETS_MS.items():
+        argv = [sys.executable, os.path.abspath(__file__)] + list(command)
+        times = []
+        for _ in range(options.runs):
+            start = time.perf_counter()
+            subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            times.append((time.perf_counter() - start) * 1000)
+        traced = subprocess.run(argv[:1] + ['-X', 'importtime'] + argv[1:], stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, text=True)
+        imports, _ = parse_importtime(traced.stderr)
+        heavy = sorted({m for m, _, _, _ in imports if m in HEAVY_MODULES})
+        best_ms = min(times)
+        ok = best_ms <= budget_ms and not heavy
+        failed |= not ok
+        note = f", imports {', '.join(heavy)}" if heavy else ''
+        print(f"{'OK  ' if ok else 'FAIL'} crowdalpha.py {' '.join(command)}: {best_ms:.0f} ms (budget {budget_ms} ms){note}")
+    return 1 if failed else 0
+
+def main():
+    args = sys.argv[1:]
+    if args and args[0] == '--profile-imports':
+        sys.exit(profile_imports(args[1:]))
+    if not args or args[0] in ('-h', '--help'):
+        print(usage())
+        sys.exit(0 if args else 2)
+    name, rest = args[0], args[1:]
+    if name == 'check-startup':
+        sys.exit(check_startup(rest))
+    if name not in COMMANDS:
+        print(usage(), file=sys.stderr)
+        print(f"\nUnknown command: {name}", file=sys.stderr)
+        sys.exit(2)
+    run_command(name, rest)
+
+if __name__ == '__main__':
+    main()
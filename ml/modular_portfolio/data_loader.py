@@ -1,18 +1,57 @@
 import pandas as pd
+import numpy as np
+import hashlib
+import json
 import os
+import shutil
+import sys
+from feature_engineering import FEATURE_COLUMNS, feature_matrix, aggregate_interval_features
 
-def load_and_merge_data(processed_sentiments_file_path, prices_csv_file_path, required_headers=None):
+# Price store reader shared with the ingestion scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'scripts', 'utils'))
+from price_store import is_price_store, meta_path, open_price_store
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'cache', 'merged')
+CACHE_VERSION = 2
+
+# Compact dtypes for the merged frame; a column falls back to float64 when its values do not fit.
+# Float columns (TwoYearGain, daily_gain) stay float64 so cached runs match uncached ones exactly.
+COMPACT_INT_COLUMNS = {
+    'OwnerID': np.int32,
+    'PlayerLevel': np.int8,
+    'MonthsActive': np.int16,
+    'daysSincePost': np.int16,
+    'SentimentScore': np.int8,
+}
+
+# Rows per chunk for load_feature_aggregates
+DEFAULT_CHUNKSIZE = 1_000_000
+FEATURE_SOURCE_COLUMNS = ['date', 'Symbol', 'PlayerLevel', 'TwoYearGain', 'MonthsActive', 'daysSincePost']
+
+def load_and_merge_data(processed_sentiments_file_path, prices_csv_file_path, required_headers=None,
+                        cache_dir=None, mmap=True):
+    """
+    Load the processed sentiments and prices CSVs and merge them on (date, Symbol).
+    prices_csv_file_path may also be a price store directory (calculate_daily_gains.py), in which
+    case daily_gain is joined by array lookup instead of a merge.
+    With cache_dir, the merged result is stored there as typed NumPy columns and reused
+    while both source files are unchanged (same size and mtime, or same content hash).
+    With mmap (the default), a frame served from the cache is backed by read-only memory maps:
+    adding columns works, but assigning into existing ones raises ValueError, so pass mmap=False
+    or take a .copy() before modifying values in place.
+    """
+    prices_is_store = is_price_store(prices_csv_file_path)
+    if cache_dir is not None:
+        # A store's meta.json carries a digest of its arrays, so it changes whenever their values do
+        sources = [processed_sentiments_file_path,
+                   meta_path(prices_csv_file_path) if prices_is_store else prices_csv_file_path]
+        cache_path = _cache_path(cache_dir, sources)
+        merged_df = _read_cache(cache_path, sources, mmap)
+        if merged_df is not None:
+            _check_headers(merged_df, required_headers)
+            return merged_df
     df = pd.read_csv(processed_sentiments_file_path)
-    prices_df = pd.read_csv(prices_csv_file_path)
-    prices_df = prices_df.rename(columns={
-        'symbol': 'Symbol',
-        'date': 'date',
-        'daily_gain': 'daily_gain'
-    })
-    if required_headers:
-        missing = [h for h in required_headers if h not in df.columns]
-        if missing:
-            raise ValueError(f"Missing required columns: {missing}")
+    _check_headers(df, required_headers)
     # Convert columns
     df['CreateTime'] = pd.to_datetime(df['CreateTime'], errors='coerce')
     df['date'] = pd.to_datetime(df['date'], errors='coerce')
@@ -20,9 +59,166 @@ def load_and_merge_data(processed_sentiments_file_path, prices_csv_file_path, re
         df[col] = pd.to_numeric(df[col], errors='coerce')
     for col in ['TwoYearGain', 'SentimentScore']:
         df[col] = pd.to_numeric(df[col], errors='coerce')
-    if 'date' in prices_df.columns:
-        prices_df['date'] = pd.to_datetime(prices_df['date'], errors='coerce')
-    if 'daily_gain' in prices_df.columns:
-        prices_df['daily_gain'] = pd.to_numeric(prices_df['daily_gain'], errors='coerce')
-    merged_df = pd.merge(df, prices_df, on=['date', 'Symbol'], how='left', suffixes=('', '_price'))
+    if prices_is_store:
+        merged_df = df
+        merged_df['daily_gain'] = open_price_store(prices_csv_file_path).lookup('daily_gain', df['date'], df['Symbol'])
+    else:
+        prices_df = pd.read_csv(prices_csv_file_path)
+        prices_df = prices_df.rename(columns={
+            'symbol': 'Symbol',
+            'date': 'date',
+            'daily_gain': 'daily_gain'
+        })
+        if 'date' in prices_df.columns:
+            prices_df['date'] = pd.to_datetime(prices_df['date'], errors='coerce')
+        if 'daily_gain' in prices_df.columns:
+            prices_df['daily_gain'] = pd.to_numeric(prices_df['daily_gain'], errors='coerce')
+        merged_df = pd.merge(df, prices_df, on=['date', 'Symbol'], how='left', suffixes=('', '_price'))
+    if cache_dir is not None:
+        _write_cache(cache_path, sources, merged_df)
+        # Serve the compact, memory-mapped copy so cached and uncached runs see the same data
+        return _read_cache(cache_path, sources, mmap)
     return merged_df
+
+def load_feature_aggregates(processed_sentiments_file_path, prices_csv_file_path, required_headers=None,
+                            chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Streaming equivalent of aggregate_features(load_and_merge_data(...)).
+    Reads the sentiments CSV in chunks and accumulates the per-(date, Symbol) feature sums,
+    joining daily_gain only on the aggregated frame, so peak memory is bounded by the
+    number of date x symbol cells instead of the number of rows.
+    """
+    _check_headers(pd.read_csv(processed_sentiments_file_path, nrows=0), required_headers)
+    totals = None
+    for chunk in pd.read_csv(processed_sentiments_file_path, usecols=FEATURE_SOURCE_COLUMNS, chunksize=chunksize):
+        chunk['date'] = pd.to_datetime(chunk['date'], errors='coerce')
+        for col in ['PlayerLevel', 'TwoYearGain', 'MonthsActive', 'daysSincePost']:
+            chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+        features_df = pd.DataFrame(feature_matrix(chunk), columns=FEATURE_COLUMNS, index=chunk.index)
+        features_df['date'] = chunk['date']
+        features_df['Symbol'] = chunk['Symbol']
+        partial = features_df.groupby(['date', 'Symbol'])[FEATURE_COLUMNS].sum()
+        totals = partial if totals is None else totals.add(partial, fill_value=0)
+    if totals is None:
+        totals = pd.DataFrame(columns=['date', 'Symbol'] + FEATURE_COLUMNS).set_index(['date', 'Symbol'])
+    agg_df = totals.sort_index().reset_index()
+    return agg_df.merge(_load_daily_gains(prices_csv_file_path), on=['date', 'Symbol'], how='left')
+
+def load_interval_aggregates(intervals_file_path, prices_csv_file_path, required_headers=None):
+    """
+    Equivalent of load_feature_aggregates for interval-encoded sentiments
+    (process_sentiments.py --format intervals): one row per post is read and the
+    per-(date, Symbol) feature sums are built with difference arrays, then daily_gain is joined.
+    """
+    df = pd.read_csv(intervals_file_path)
+    _check_headers(df, required_headers)
+    for col in ['start_date', 'end_date']:
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+    for col in ['PlayerLevel', 'TwoYearGain', 'MonthsActive']:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df = df.dropna(subset=['start_date', 'end_date'])
+    agg_df = aggregate_interval_features(df)
+    return agg_df.merge(_load_daily_gains(prices_csv_file_path), on=['date', 'Symbol'], how='left')
+
+def _load_daily_gains(prices_csv_file_path):
+    if is_price_store(prices_csv_file_path):
+        prices_df = open_price_store(prices_csv_file_path).to_frame('daily_gain')
+        return prices_df.rename(columns={'symbol': 'Symbol'})
+    prices_df = pd.read_csv(prices_csv_file_path).rename(columns={'symbol': 'Symbol'})
+    prices_df['date'] = pd.to_datetime(prices_df['date'], errors='coerce')
+    prices_df['daily_gain'] = pd.to_numeric(prices_df['daily_gain'], errors='coerce')
+    return prices_df[['date', 'Symbol', 'daily_gain']].drop_duplicates(subset=['date', 'Symbol'])
+
+def _check_headers(df, required_headers):
+    if required_headers:
+        missing = [h for h in required_headers if h not in df.columns]
+        if missing:
+            raise ValueError(f"Missing required columns: {missing}")
+
+def _cache_path(cache_dir, sources):
+    key = '|'.join(os.path.abspath(path) for path in sources)
+    return os.path.join(cache_dir, hashlib.sha256(key.encode()).hexdigest()[:16])
+
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def _source_info(path, with_hash=True):
+    stat = os.stat(path)
+    info = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        info['sha256'] = _file_hash(path)
+    return info
+
+def _sources_match(cached_sources, sources):
+    if len(cached_sources) != len(sources):
+        return False
+    for cached, path in zip(cached_sources, sources):
+        current = _source_info(path, with_hash=False)
+        if current['size'] != cached['size']:
+            return False
+        # A touched but unchanged file still matches on content
+        if current['mtime_ns'] != cached['mtime_ns'] and _file_hash(path) != cached['sha256']:
+            return False
+    return True
+
+def _compact_column(name, series):
+    """Return (array, info) for one merged column in its compact on-disk form."""
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        return series.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy('datetime64[ns]'), {'kind': 'datetime', 'tz': str(series.dt.tz)}
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.to_numpy('datetime64[ns]'), {'kind': 'datetime', 'tz': None}
+    if name in COMPACT_INT_COLUMNS:
+        int_dtype = COMPACT_INT_COLUMNS[name]
+        values = series.to_numpy(dtype=float)
+        limits = np.iinfo(int_dtype)
+        if (not np.isnan(values).any() and np.array_equal(values, np.round(values))
+                and (len(values) == 0 or (values.min() >= limits.min and values.max() <= limits.max))):
+            return values.astype(int_dtype), {'kind': 'numeric'}
+        return values, {'kind': 'numeric'}
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(), {'kind': 'numeric'}
+    codes, categories = pd.factorize(series, sort=True)
+    return codes.astype(np.int32), {'kind': 'category', 'categories': [str(c) for c in categories]}
+
+def _write_cache(cache_path, sources, merged_df):
+    tmp_path = cache_path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    columns = {}
+    for i, name in enumerate(merged_df.columns):
+        array, info = _compact_column(name, merged_df[name])
+        info['file'] = f'{i}.npy'
+        np.save(os.path.join(tmp_path, info['file']), array)
+        columns[name] = info
+    meta = {
+        'version': CACHE_VERSION,
+        'sources': [_source_info(path) for path in sources],
+        'columns': columns,
+    }
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(tmp_path, cache_path)
+
+def _read_cache(cache_path, sources, mmap=True):
+    meta_file = os.path.join(cache_path, 'meta.json')
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file) as f:
+        meta = json.load(f)
+    if meta.get('version') != CACHE_VERSION or not _sources_match(meta['sources'], sources):
+        return None
+    data = {}
+    for name, info in meta['columns'].items():
+        array = np.load(os.path.join(cache_path, info['file']), mmap_mode='r' if mmap else None)
+        if info['kind'] == 'category':
+            data[name] = pd.Categorical.from_codes(array, categories=info['categories'])
+        elif info['kind'] == 'datetime' and info['tz']:
+            data[name] = pd.DatetimeIndex(array).tz_localize('UTC').tz_convert(info['tz'])
+        else:
+            data[name] = array
+    return pd.DataFrame(data, copy=False)
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import sqlite3
+import time
+import numpy as np
+from feature_engineering import score_feature_tensor
+from portfolio_simulation import simulate_portfolio_matrix
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), 'cache', 'evaluations.sqlite')
+DEFAULT_MAX_ENTRIES = 200000
+# How many inserts a process makes between eviction checks
+EVICTION_CHECK_INTERVAL = 100
+
+def dataset_fingerprint(tensor):
+    """Hash the numeric content of a FeatureTensor (plus its symbols, when known)."""
+    h = hashlib.sha256()
+    for array in (tensor.features, tensor.gains):
+        array = np.ascontiguousarray(array)
+        h.update(f'{array.dtype.str}{array.shape}'.encode())
+        h.update(array.tobytes())
+    if tensor.symbols is not None:
+        h.update('\x1f'.join(map(str, tensor.symbols)).encode())
+    return h.hexdigest()
+
+class EvaluationCache:
+    """
+    On-disk cache of simulated portfolio value paths for one dataset fingerprint.
+    Backed by SQLite so every optimizer worker and later runs share it. Once it holds
+    more than max_entries rows the least recently used ones are evicted.
+    Picklable: each process opens its own connection on first use.
+    """
+
+    def __init__(self, fingerprint, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.fingerprint = fingerprint
+        self.path = path
+        self.max_entries = max_entries
+        self._conn = None
+        self._pid = None
+        self._puts = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        state['_pid'] = None
+        return state
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS evaluations ('
+                'key TEXT PRIMARY KEY, vals BLOB NOT NULL, last_used REAL NOT NULL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS evaluations_last_used ON evaluations (last_used)')
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def key(self, weights, top_n, allocation, start_date, end_date):
+        weights = ','.join(f'{w:.8f}' for w in np.round(np.asarray(weights, dtype=float), 8))
+        return f'{self.fingerprint}|{weights}|{top_n}|{allocation}|{start_date}|{end_date}'
+
+    def get(self, weights, top_n, allocation, start_date, end_date):
+        """Return the cached value path, or None on a miss."""
+        key = self.key(weights, top_n, allocation, start_date, end_date)
+        conn = self._connection()
+        row = conn.execute('SELECT vals FROM evaluations WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute('UPDATE evaluations SET last_used = ? WHERE key = ?', (time.time(), key))
+        return np.frombuffer(row[0], dtype=np.float64)
+
+    def put(self, weights, top_n, allocation, start_date, end_date, values):
+        key = self.key(weights, top_n, allocation, start_date, end_date)
+        blob = np.asarray(values, dtype=np.float64).tobytes()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO evaluations (key, vals, last_used) VALUES (?, ?, ?)',
+                (key, blob, time.time())
+            )
+        self._puts += 1
+        if self._puts % EVICTION_CHECK_INTERVAL == 0:
+            self.evict()
+
+    def evict(self):
+        conn = self._connection()
+        (count,) = conn.execute('SELECT COUNT(*) FROM evaluations').fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            with conn:
+                conn.execute(
+                    'DELETE FROM evaluations WHERE key IN '
+                    '(SELECT key FROM evaluations ORDER BY last_used LIMIT ?)',
+                    (excess,)
+                )
+
+def simulate_cached(tensor, weights, top_n, allocation, start_date, end_date, cache=None):
+    """Return the value path for weights over tensor, reading and filling cache when given."""
+    if cache is not None:
+        values = cache.get(weights, top_n, allocation, start_date, end_date)
+        if values is not None:
+            return values
+    scores = score_feature_tensor(tensor, weights)
+    values = simulate_portfolio_matrix(scores, tensor.gains, top_n=top_n, allocation=allocation)
+    if cache is not None:
+        cache.put(weights, top_n, allocation, start_date, end_date, values)
+    return values
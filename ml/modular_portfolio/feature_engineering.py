@@ -1,4 +1,13 @@
 import numpy as np
+import pandas as pd
+from collections import namedtuple
+from portfolio_simulation import pivot_daily_matrix
+
+# Per-row score features, in the order of the add_score_column weights
+FEATURE_COLUMNS = ['PlayerLevel', 'TwoYearGain', 'MonthsActive', 'PostRecency']
+
+# Dense date x symbol x feature sums plus the matching date x symbol daily gains
+FeatureTensor = namedtuple('FeatureTensor', ['dates', 'symbols', 'features', 'gains'])
 
 def add_score_column(df, weight_player_level, weight_two_year_gain, weight_months_active, weight_days_since_post, score_col='score'):
     weighted_sum = (
@@ -15,7 +24,7 @@ def aggregate_scores(merged_df, score_columns='score'):
         score_columns = [score_columns]
     sum_columns = score_columns  # List of columns to sum
     sum_dict = {col: 'sum' for col in sum_columns if col in merged_df.columns}
-    agg_df = merged_df.groupby(['date', 'Symbol'], as_index=False).agg(sum_dict)
+    agg_df = merged_df.groupby(['date', 'Symbol'], as_index=False, observed=True).agg(sum_dict)
     if 'daily_gain' in merged_df.columns:
         daily_gain_df = merged_df[['date', 'Symbol', 'daily_gain']].drop_duplicates(subset=['date', 'Symbol'])
         agg_df = agg_df.merge(daily_gain_df, on=['date', 'Symbol'], how='left')
@@ -25,3 +34,146 @@ def filter_date_range(agg_df, start_date, end_date):
     agg_df = agg_df[(agg_df['date'] >= start_date) & (agg_df['date'] <= end_date)]
     agg_df = agg_df.sort_values('date')
     return agg_df
+
+def feature_matrix(df):
+    """
+    Return the per-row score features as an (n_rows, 4) array in FEATURE_COLUMNS order.
+    Rows with any NaN feature get a NaN score in add_score_column and drop out of the
+    aggregated sum, so they are zeroed here.
+    """
+    features = np.column_stack([
+        df['PlayerLevel'].to_numpy(dtype=float),
+        df['TwoYearGain'].to_numpy(dtype=float),
+        df['MonthsActive'].to_numpy(dtype=float),
+        np.maximum(0, 365 - df['daysSincePost'].to_numpy(dtype=float)),
+    ])
+    features[np.isnan(features).any(axis=1)] = 0
+    return features
+
+def aggregate_features(merged_df):
+    """
+    Sum the score features per (date, Symbol).
+    Since the score is linear in the weights, aggregate_scores for any weights equals
+    score_features on this frame.
+    """
+    features_df = pd.DataFrame(feature_matrix(merged_df), columns=FEATURE_COLUMNS, index=merged_df.index)
+    features_df['date'] = merged_df['date']
+    features_df['Symbol'] = merged_df['Symbol']
+    agg_df = features_df.groupby(['date', 'Symbol'], as_index=False, observed=True)[FEATURE_COLUMNS].sum()
+    if 'daily_gain' in merged_df.columns:
+        daily_gain_df = merged_df[['date', 'Symbol', 'daily_gain']].drop_duplicates(subset=['date', 'Symbol'])
+        agg_df = agg_df.merge(daily_gain_df, on=['date', 'Symbol'], how='left')
+    return agg_df
+
+def aggregate_interval_features(intervals_df):
+    """
+    Equivalent of aggregate_features for interval-encoded sentiments (one row per post with
+    start_date/end_date, see process_sentiments.py --format intervals), without expanding posts to days.
+    Each post adds its constant features to a date x symbol difference array at start_date and
+    subtracts them after end_date, so a cumulative sum over dates gives the per-day sums.
+    PostRecency on day t is (365 + start) - t until 364 days after the start, so it is rebuilt from
+    the cumulative sums of (365 + start) and of the post count over that shorter range.
+    (date, Symbol) cells covered by at least one post are returned, in date then Symbol order.
+    """
+    start_dates = pd.to_datetime(intervals_df['start_date'])
+    start = start_dates.to_numpy('datetime64[D]')
+    end = pd.to_datetime(intervals_df['end_date']).to_numpy('datetime64[D]')
+    sym_codes, symbols = pd.factorize(intervals_df['Symbol'], sort=True)
+    keep = (sym_codes >= 0) & (end >= start)
+    start, end, sym_codes = start[keep], end[keep], sym_codes[keep]
+    if len(start) == 0:
+        return pd.DataFrame(columns=['date', 'Symbol'] + FEATURE_COLUMNS)
+    first_day = start.min()
+    s = (start - first_day).astype(np.int64)
+    e = (end - first_day).astype(np.int64)
+    n_days, n_symbols = int(e.max()) + 1, len(symbols)
+
+    constants = np.column_stack([
+        intervals_df[col].to_numpy(dtype=float)[keep] for col in FEATURE_COLUMNS[:3]
+    ])
+    # Like feature_matrix: a post with any NaN feature counts as all zero
+    valid = ~np.isnan(constants).any(axis=1)
+    constants[~valid] = 0
+    recency_end = np.minimum(e, s + 364)
+    columns = [
+        (s, e, np.ones(len(s))),                       # posts covering the cell
+        *[(s, e, constants[:, i]) for i in range(3)],  # constant features
+        (s, recency_end, np.where(valid, 1.0, 0.0)),   # posts still inside the recency window
+        (s, recency_end, np.where(valid, 365.0 + s, 0.0)),
+    ]
+    size = (n_days + 1) * n_symbols
+    sums = np.empty((len(columns), n_days, n_symbols))
+    for k, (lo, hi, values) in enumerate(columns):
+        diff = np.bincount(lo * n_symbols + sym_codes, weights=values, minlength=size)
+        diff -= np.bincount((hi + 1) * n_symbols + sym_codes, weights=values, minlength=size)
+        sums[k] = np.cumsum(diff.reshape(n_days + 1, n_symbols)[:n_days], axis=0)
+    count, recency_count, recency_base = sums[0], sums[4], sums[5]
+    recency = recency_base - np.arange(n_days)[:, None] * recency_count
+
+    day_idx, sym_idx = np.nonzero(count > 0.5)
+    agg_df = pd.DataFrame({
+        'date': (first_day + day_idx.astype('timedelta64[D]')).astype(start_dates.dtype),
+        'Symbol': np.asarray(symbols)[sym_idx],
+    })
+    for i, col in enumerate(FEATURE_COLUMNS[:3]):
+        agg_df[col] = sums[i + 1][day_idx, sym_idx]
+    agg_df['PostRecency'] = recency[day_idx, sym_idx]
+    return agg_df
+
+def score_features(feature_df, weights, score_col='score'):
+    feature_df[score_col] = feature_df[FEATURE_COLUMNS].to_numpy() @ np.asarray(weights, dtype=float)
+    return feature_df
+
+def build_feature_tensor(merged_df, start_date=None, end_date=None, feature_df=None):
+    """
+    Build the FeatureTensor once from load_and_merge_data output (or from an
+    aggregate_features frame passed as feature_df), optionally limited to a date range.
+    Cells with no rows are NaN, so their scores are NaN and they are never picked.
+    """
+    if feature_df is None:
+        feature_df = aggregate_features(merged_df)
+    if start_date is not None and end_date is not None:
+        feature_df = filter_date_range(feature_df, start_date, end_date)
+    dates, symbols, matrices = pivot_daily_matrix(feature_df, FEATURE_COLUMNS + ['daily_gain'])
+    features = np.stack([matrices[col] for col in FEATURE_COLUMNS], axis=-1)
+    return FeatureTensor(dates, symbols, features, matrices['daily_gain'])
+
+def score_feature_tensor(tensor, weights):
+    """Return the date x symbol score matrix for one weight vector."""
+    return tensor.features @ np.asarray(weights, dtype=float)
+
+def score_feature_tensor_batch(tensor, weight_matrix):
+    """Return candidates x dates x symbols score matrices for a (4, P) weight matrix."""
+    weight_matrix = np.asarray(weight_matrix, dtype=float).reshape(len(FEATURE_COLUMNS), -1)
+    return np.einsum('dsf,fp->pds', tensor.features, weight_matrix)
+
+def prune_feature_tensor(tensor, top_n):
+    """
+    Drop cells that can never make a day's top_n under non-negative weights: a cell that
+    top_n other cells dominate (match or beat on every feature and beat on at least one)
+    always ranks below them. Identical cells do not dominate each other, so ties are kept.
+    Cells that tie in score at rank top_n without being identical (e.g. two symbols scoring the
+    same under [1, 1, 1, 1]) are both kept, but the top-N selection breaks such ties by column
+    position, which pruning shifts; the picked symbol, and the path from that day on, can differ.
+    Returns a FeatureTensor whose symbol axis holds each day's remaining candidates
+    (NaN padded); symbols is None since a column no longer maps to one symbol.
+    """
+    n_dates, _, n_features = tensor.features.shape
+    kept = []
+    for day in range(n_dates):
+        features = tensor.features[day]
+        idx = np.flatnonzero(~np.isnan(features).any(axis=1))
+        if len(idx) > top_n:
+            candidates = features[idx]
+            at_least = (candidates[:, None, :] >= candidates[None, :, :]).all(axis=-1)
+            beats = (candidates[:, None, :] > candidates[None, :, :]).any(axis=-1)
+            dominated_by = (at_least & beats).sum(axis=0)
+            idx = idx[dominated_by < top_n]
+        kept.append(idx)
+    width = max((len(idx) for idx in kept), default=0)
+    features = np.full((n_dates, width, n_features), np.nan)
+    gains = np.full((n_dates, width), np.nan)
+    for day, idx in enumerate(kept):
+        features[day, :len(idx)] = tensor.features[day, idx]
+        gains[day, :len(idx)] = tensor.gains[day, idx]
+    return FeatureTensor(tensor.dates, None, features, gains)
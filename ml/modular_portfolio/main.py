@@ -1,49 +1,109 @@
 import os
-import sys
-import numpy as np
-from data_loader import load_and_merge_data
-from feature_engineering import add_score_column, aggregate_scores, filter_date_range
-from portfolio_simulation import simulate_portfolio, calculate_daily_change, calculate_max_drawdown
-from visualization import plot_portfolio_gains, plot_daily_changes, plot_max_drawdown_bar
-import pandas as pd
-from unsupervised_weight_search_v2 import find_best_vector
+
+# Heavy modules (pandas, NumPy, SciPy, matplotlib) are imported inside main() once the
+# arguments are parsed, and only on the paths that need them, so --help and the
+# baseline run do not pay for the optimizer or the plots.
 
 BASE_DIR = os.path.dirname(__file__)
 REQUIRED_HEADERS = [
     'OwnerID', 'CreateTime', 'PlayerLevel', 'TwoYearGain', 'MonthsActive',
     'Symbol', 'SentimentScore', 'date', 'daysSincePost'
 ]
+INTERVAL_HEADERS = [
+    'OwnerID', 'CreateTime', 'PlayerLevel', 'TwoYearGain', 'MonthsActive',
+    'Symbol', 'SentimentScore', 'start_date', 'end_date'
+]
 
 def main():
     import argparse
     parser = argparse.ArgumentParser(description='Portfolio baseline simulation')
     parser.add_argument('sentiments_processed', type=str, help='Path to processed sentiments CSV')
-    parser.add_argument('prices_agg', type=str, help='Path to prices/gains CSV')
+    parser.add_argument('prices_agg', type=str, help='Path to prices/gains CSV or price store directory')
+    parser.add_argument('--output-dir', type=str, default=None, help='Directory for the best weights, plots and caches (default: this directory)')
+    parser.add_argument('--cache-dir', type=str, default=None, help='Directory for the typed columnar cache of the merged data (default: cache/merged in the output directory)')
+    parser.add_argument('--no-cache', action='store_true', default=False, help='Always re-parse the CSVs instead of using the merged data cache')
+    parser.add_argument('--streaming', action='store_true', default=False, help='Aggregate the sentiments file in chunks instead of loading and merging it whole')
+    parser.add_argument('--intervals', action='store_true', default=False, help='The sentiments file is interval-encoded (process_sentiments.py --format intervals)')
+    parser.add_argument('--sweep-top-n', type=int, nargs='+', default=None, help='Baseline top N values to sweep with both allocations (e.g. 10 15 20)')
+    parser.add_argument('--walk-forward', action='store_true', default=False, help='Run a walk-forward backtest over the whole dataset instead of the single in-sample optimization')
+    parser.add_argument('--train-months', type=int, default=12, help='Walk-forward train window length in months (default: 12)')
+    parser.add_argument('--test-months', type=int, default=1, help='Walk-forward test window length in months (default: 1)')
+    parser.add_argument('--vectorized', action='store_true', default=False, help='Score each optimizer generation in one batched array pass instead of a worker pool')
     args = parser.parse_args()
+    import numpy as np
+    import pandas as pd
+    from data_loader import load_and_merge_data, load_feature_aggregates, load_interval_aggregates
+    from feature_engineering import add_score_column, aggregate_scores, filter_date_range, score_features, build_feature_tensor
+    from portfolio_simulation import simulate_portfolio_vectorized, sweep_portfolios, format_sweep_report, pivot_daily_matrix, top_n_holdings
+    from risk_metrics import compute_risk_metrics, format_risk_metrics, infer_periods_per_year
     report_lines = []
     def log(msg):
         print(msg)
         report_lines.append(str(msg))
+    output_dir = args.output_dir or BASE_DIR
+    if args.output_dir:
+        os.makedirs(output_dir, exist_ok=True)
     processed_sentiments_file_path = args.sentiments_processed
     prices_csv_file_path = args.prices_agg
-    merged_df = load_and_merge_data(processed_sentiments_file_path, prices_csv_file_path, REQUIRED_HEADERS)
-    log(f"Loaded {len(merged_df)} rows after merging.")
-    # Baseline: all weights = 1
-    merged_df = add_score_column(merged_df, 1, 1, 1, 1)
-    agg_df = aggregate_scores(merged_df)
+    if args.intervals:
+        feature_df = load_interval_aggregates(processed_sentiments_file_path, prices_csv_file_path, INTERVAL_HEADERS)
+        merged_df = None
+        log(f"Aggregated to {len(feature_df)} (date, Symbol) rows from sentiment intervals.")
+        agg_df = score_features(feature_df.copy(), [1, 1, 1, 1])
+    elif args.streaming:
+        feature_df = load_feature_aggregates(processed_sentiments_file_path, prices_csv_file_path, REQUIRED_HEADERS)
+        merged_df = None
+        log(f"Aggregated to {len(feature_df)} (date, Symbol) rows while streaming.")
+        agg_df = score_features(feature_df.copy(), [1, 1, 1, 1])
+    else:
+        cache_dir = None if args.no_cache else (args.cache_dir or os.path.join(output_dir, 'cache', 'merged'))
+        merged_df = load_and_merge_data(processed_sentiments_file_path, prices_csv_file_path, REQUIRED_HEADERS, cache_dir=cache_dir)
+        feature_df = None
+        log(f"Loaded {len(merged_df)} rows after merging.")
+        # Baseline: all weights = 1
+        merged_df = add_score_column(merged_df, 1, 1, 1, 1)
+        agg_df = aggregate_scores(merged_df)
     agg_df = filter_date_range(agg_df, pd.to_datetime('2024-06-01'), pd.to_datetime('2025-05-31'))
     log(f"agg_df rows after date filter: {len(agg_df)}")
     temp_df = agg_df[['date', 'Symbol', 'score', 'daily_gain']].copy()
-    dates, values = simulate_portfolio(temp_df, top_n=10, allocation='equal')
+    dates, values = simulate_portfolio_vectorized(temp_df, top_n=10, allocation='equal')
     if len(values) > 0:
         total_gain = (values[-1] - 1.0) * 100
         log(f"Baseline Weights: [1, 1, 1, 1], Total Gain: {total_gain:.2f}%")
+        _, _, matrices = pivot_daily_matrix(temp_df)
+        holdings = top_n_holdings(matrices['score'], matrices['daily_gain'], top_n=10, allocation='equal')
+        metrics = compute_risk_metrics(values, holdings, periods_per_year=infer_periods_per_year(dates))
+        log(format_risk_metrics(metrics, ['Baseline risk metrics'])[0])
     else:
         log("No valid portfolio values computed.")
+    if args.sweep_top_n:
+        sweep_dates, sweep_results = sweep_portfolios(temp_df, args.sweep_top_n)
+        for line in format_sweep_report(sweep_results):
+            log(line)
+        from visualization import plot_sweep_max_drawdown
+        plot_sweep_max_drawdown(sweep_results, os.path.join(output_dir, 'portfolio_sweep_max_drawdown.png'))
+
+    if args.walk_forward:
+        from visualization import plot_portfolio_gains
+        from walk_forward import walk_forward
+        tensor = build_feature_tensor(merged_df, feature_df=feature_df)
+        wf_dates, wf_values, folds = walk_forward(tensor, args.train_months, args.test_months)
+        for _, fold in folds.iterrows():
+            log(f"Fold train {fold['train_start'].date()}..{fold['train_end'].date()} "
+                f"test {fold['test_start'].date()}..{fold['test_end'].date()}: weights={np.round(fold['weights'], 4)}, "
+                f"in-sample gain {fold['train_gain']:.2f}%, out-of-sample gain {fold['test_gain']:.2f}%")
+        if len(wf_values):
+            log(f"Walk-forward out-of-sample total gain: {(wf_values[-1] - 1.0) * 100:.2f}%")
+            plot_portfolio_gains(wf_dates, {'Walk-forward (out-of-sample)': wf_values}, os.path.join(output_dir, 'walk_forward_equity.png'))
+        else:
+            log("Walk-forward: no folds with out-of-sample days, no total gain to report.")
+        return
 
     # Run unsupervised optimization and save results
-    best_weights, best_gain = find_best_vector(merged_df)
-    with open(os.path.join(BASE_DIR, 'unsupervised_best_weights.txt'), 'w') as f:
+    from unsupervised_weight_search_v2 import find_best_vector
+    evaluation_cache = os.path.join(output_dir, 'cache', 'evaluations.sqlite')
+    best_weights, best_gain = find_best_vector(merged_df, cache_path=evaluation_cache, vectorized=args.vectorized, feature_df=feature_df)
+    with open(os.path.join(output_dir, 'unsupervised_best_weights.txt'), 'w') as f:
         f.write(f'Best weights: {best_weights}\nActual total gain: {best_gain}\n')
 
 if __name__ == "__main__":
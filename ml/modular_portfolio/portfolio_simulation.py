@@ -1,4 +1,6 @@
 import numpy as np
+import pandas as pd
+from risk_metrics import compute_risk_metrics, infer_periods_per_year, TRADING_DAYS
 
 def simulate_portfolio(agg_df, top_n=10, allocation='equal'):
     values = []
@@ -22,6 +24,187 @@ def simulate_portfolio(agg_df, top_n=10, allocation='equal'):
         dates.append(day)
     return dates, values
 
+def pivot_daily_matrix(agg_df, columns=('score', 'daily_gain')):
+    """
+    Pivot long (date, Symbol) rows into dense date x symbol arrays, one per column.
+    Returns (dates, symbols, matrices) where matrices maps each column to a float array.
+    Cells without a row are NaN.
+    """
+    agg_df = agg_df[agg_df['date'].notna()]
+    date_codes, dates = pd.factorize(agg_df['date'], sort=True)
+    symbol_codes, symbols = pd.factorize(agg_df['Symbol'], sort=True)
+    matrices = {}
+    for col in columns:
+        matrix = np.full((len(dates), len(symbols)), np.nan)
+        matrix[date_codes, symbol_codes] = agg_df[col].to_numpy(dtype=float)
+        matrices[col] = matrix
+    return dates, symbols, matrices
+
+def _top_n_picks(scores, gains, top_n, allocation):
+    """
+    Each day's top_n picks for simulate_portfolio_matrix and top_n_holdings.
+    Returns (picks, weights, top_gains), one row per (batch entry, date): the picked symbol
+    columns, their weights (0 for picks without a score or gain) and their gains (0 where invalid).
+    """
+    if allocation not in ('equal', 'proportional'):
+        raise ValueError('Unknown allocation type')
+    n_dates, n_symbols = gains.shape
+    k = min(top_n, n_symbols)
+    # Work on one row per (batch entry, date); argpartition is much faster on 2D input
+    scores = scores.reshape(-1, n_symbols)
+    rows = np.arange(len(scores))[:, None]
+    days = rows % n_dates
+    present = ~np.isnan(scores)
+    if k < n_symbols:
+        ranked = np.where(present, -scores, np.inf)
+        picks = np.argpartition(ranked, k - 1, axis=1)[:, :k]
+    else:
+        picks = np.broadcast_to(np.arange(k), scores.shape)
+    top_scores = scores[rows, picks]
+    top_gains = gains[days, picks]
+    valid = present[rows, picks] & ~np.isnan(top_gains)
+    counts = valid.sum(axis=1)
+    weights = valid / np.maximum(counts, 1)[:, None]
+    if allocation == 'proportional':
+        valid_scores = np.where(valid, top_scores, 0.0)
+        totals = valid_scores.sum(axis=1)
+        positive = totals > 0
+        weights[positive] = valid_scores[positive] / totals[positive, None]
+    return picks, weights, np.where(valid, top_gains, 0.0)
+
+def simulate_portfolio_matrix(scores, gains, top_n=10, allocation='equal'):
+    """
+    Matrix form of simulate_portfolio.
+    scores and gains are date x symbol arrays as built by pivot_daily_matrix; NaN scores mark
+    symbols with no row that day. Each day the top_n scores are picked with a row-wise
+    partial selection, then symbols with a NaN gain are dropped from the picks.
+    scores may carry leading batch dimensions (e.g. candidates x dates x symbols) to simulate
+    many portfolios over the same gains at once.
+    Returns the array of portfolio values, one per date (per batch entry).
+    """
+    if allocation not in ('equal', 'proportional'):
+        raise ValueError('Unknown allocation type')
+    scores = np.asarray(scores, dtype=float)
+    gains = np.asarray(gains, dtype=float)
+    batch_shape = scores.shape[:-1]
+    if min(top_n, gains.shape[1]) <= 0:
+        return np.ones(batch_shape)
+    _, weights, top_gains = _top_n_picks(scores, gains, top_n, allocation)
+    weighted_gain = (weights * top_gains).sum(axis=1)
+    return np.cumprod(1 + weighted_gain.reshape(batch_shape) / 100, axis=-1)
+
+def top_n_holdings(scores, gains, top_n=10, allocation='equal'):
+    """
+    The daily top_n membership matrix behind simulate_portfolio_matrix: an array shaped like
+    scores (optionally batched) holding each symbol's portfolio weight that day, 0 if not held.
+    Feed it to risk_metrics.compute_risk_metrics for turnover.
+    """
+    scores = np.asarray(scores, dtype=float)
+    gains = np.asarray(gains, dtype=float)
+    holdings = np.zeros(scores.shape)
+    if min(top_n, gains.shape[1]) <= 0:
+        return holdings
+    picks, weights, _ = _top_n_picks(scores, gains, top_n, allocation)
+    flat = holdings.reshape(-1, scores.shape[-1])
+    flat[np.arange(len(flat))[:, None], picks] = weights
+    return holdings
+
+def simulate_portfolio_vectorized(agg_df, top_n=10, allocation='equal'):
+    """Drop-in replacement for simulate_portfolio built on simulate_portfolio_matrix."""
+    dates, _, matrices = pivot_daily_matrix(agg_df)
+    values = simulate_portfolio_matrix(matrices['score'], matrices['daily_gain'], top_n, allocation)
+    return list(dates), values.tolist()
+
+def sweep_portfolios_matrix(scores, gains, top_ns, allocations=('equal', 'proportional'), periods_per_year=TRADING_DAYS):
+    """
+    Simulate every (top_n, allocation) pair from a single ranking per day.
+    Each day's scores are sorted once; cumulative sums along the rank axis then give the
+    equal and proportional daily gains for any top_n. Returns a DataFrame with one row
+    per pair: top_n, allocation, total_gain (%), max_drawdown (fraction),
+    unique_symbols (symbols picked on any day), values (the value path) and the
+    compute_risk_metrics columns cagr, volatility, sharpe, sortino, max_drawdown_duration
+    and turnover, computed for all pairs in one batch and annualized with periods_per_year.
+    """
+    for allocation in allocations:
+        if allocation not in ('equal', 'proportional'):
+            raise ValueError('Unknown allocation type')
+    scores = np.asarray(scores, dtype=float)
+    gains = np.asarray(gains, dtype=float)
+    n_symbols = scores.shape[1]
+    present = ~np.isnan(scores)
+    order = np.argsort(np.where(present, -scores, np.inf), axis=1, kind='stable')
+    ranked_present = np.take_along_axis(present, order, axis=1)
+    ranked_scores = np.take_along_axis(scores, order, axis=1)
+    ranked_gains = np.take_along_axis(gains, order, axis=1)
+    valid = ranked_present & ~np.isnan(ranked_gains)
+    valid_gains = np.where(valid, ranked_gains, 0.0)
+    valid_scores = np.where(valid, ranked_scores, 0.0)
+    cum_count = np.cumsum(valid, axis=1)
+    cum_gain = np.cumsum(valid_gains, axis=1)
+    cum_score = np.cumsum(valid_scores, axis=1)
+    cum_score_gain = np.cumsum(valid_scores * valid_gains, axis=1)
+    day_rows = np.arange(scores.shape[0])[:, None]
+    rows = []
+    holdings = []
+    for top_n in top_ns:
+        k = min(top_n, n_symbols)
+        if k <= 0:
+            equal_gain = np.zeros(scores.shape[0])
+            equal_weights = np.zeros((scores.shape[0], 0))
+            picked = np.array([], dtype=int)
+        else:
+            counts = cum_count[:, k - 1]
+            equal_gain = np.where(counts > 0, cum_gain[:, k - 1] / np.maximum(counts, 1), 0.0)
+            equal_weights = valid[:, :k] / np.maximum(counts, 1)[:, None]
+            picked = order[:, :k][ranked_present[:, :k]]
+        for allocation in allocations:
+            daily_gain = equal_gain
+            weights = equal_weights
+            if allocation == 'proportional' and k > 0:
+                totals = cum_score[:, k - 1]
+                positive = totals > 0
+                daily_gain = np.where(positive, cum_score_gain[:, k - 1] / np.where(positive, totals, 1), equal_gain)
+                weights = np.where(positive[:, None], valid_scores[:, :k] / np.where(positive, totals, 1)[:, None], equal_weights)
+            values = np.cumprod(1 + daily_gain / 100)
+            held = np.zeros(scores.shape)
+            held[day_rows, order[:, :weights.shape[1]]] = weights
+            holdings.append(held)
+            rows.append({
+                'top_n': top_n,
+                'allocation': allocation,
+                'total_gain': (values[-1] - 1.0) * 100 if len(values) > 0 else np.nan,
+                'max_drawdown': calculate_max_drawdown(values) if len(values) > 0 else np.nan,
+                'unique_symbols': len(np.unique(picked)),
+                'values': values,
+            })
+    results = pd.DataFrame(rows)
+    if len(results) and scores.shape[0] > 0:
+        metrics = compute_risk_metrics(np.stack(results['values'].to_list()), np.stack(holdings), periods_per_year=periods_per_year)
+        for col in ('cagr', 'volatility', 'sharpe', 'sortino', 'max_drawdown_duration', 'turnover'):
+            results[col] = metrics[col].to_numpy()
+    return results
+
+def sweep_portfolios(agg_df, top_ns, allocations=('equal', 'proportional')):
+    """sweep_portfolios_matrix on an aggregated (date, Symbol, score, daily_gain) frame. Returns (dates, results)."""
+    dates, _, matrices = pivot_daily_matrix(agg_df)
+    periods_per_year = infer_periods_per_year(dates)
+    return list(dates), sweep_portfolios_matrix(matrices['score'], matrices['daily_gain'], top_ns, allocations, periods_per_year)
+
+def format_sweep_report(results):
+    """Report lines for a sweep_portfolios results table, in portfolio_report.txt wording."""
+    lines = []
+    for top_n, group in results.groupby('top_n', sort=False):
+        lines.append(f"Number of unique symbols in top {top_n} across all days: {group['unique_symbols'].iloc[0]}")
+        for metric, label in (('max_drawdown', 'Max drawdown'), ('total_gain', 'Total gain')):
+            for _, row in group.iterrows():
+                value = row[metric] * 100 if metric == 'max_drawdown' else row[metric]
+                lines.append(f"{label} for {row['allocation'].capitalize()} - Top {top_n}: {value:.2f}%")
+        if 'sharpe' in group:
+            for _, row in group.iterrows():
+                lines.append(f"Sharpe ratio for {row['allocation'].capitalize()} - Top {top_n}: {row['sharpe']:.2f}, "
+                             f"daily turnover {row['turnover'] * 100:.2f}%")
+    return lines
+
 def calculate_daily_change(values):
     values = np.array(values)
     return np.diff(values, prepend=values[0])
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+METRIC_COLUMNS = [
+    'total_return', 'cagr', 'volatility', 'sharpe', 'sortino',
+    'max_drawdown', 'max_drawdown_duration', 'turnover'
+]
+
+def infer_periods_per_year(dates):
+    """
+    Periods per year of a value path from its dates: the number of steps between them over the
+    years they span. Paths with one entry per calendar date give about 365, trading-day series
+    about 252. Falls back to TRADING_DAYS when there are fewer than two distinct dates.
+    """
+    dates = pd.DatetimeIndex(dates)
+    if len(dates) < 2:
+        return TRADING_DAYS
+    years = (dates.max() - dates.min()) / pd.Timedelta(days=365.25)
+    return (len(dates) - 1) / years if years > 0 else TRADING_DAYS
+
+def period_returns(values, initial=1.0):
+    """
+    Per-period simple returns of portfolios x days value paths. The first return is measured
+    from initial, matching simulate_portfolio_matrix paths that start after the first day's gain.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    previous = np.concatenate([np.full((len(values), 1), float(initial)), values[:, :-1]], axis=1)
+    return values / previous - 1
+
+def drawdown_stats(values, initial=1.0):
+    """
+    Max drawdown (fraction below the running peak) and max drawdown duration (the longest
+    run of periods spent below a previous peak) of each portfolios x days value path.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    paths = np.concatenate([np.full((len(values), 1), float(initial)), values], axis=1)
+    running_max = np.maximum.accumulate(paths, axis=1)
+    max_drawdown = ((running_max - paths) / running_max).max(axis=1)
+    # Days since the last new peak: position minus the position of the latest peak so far
+    positions = np.arange(paths.shape[1])
+    last_peak = np.maximum.accumulate(np.where(paths >= running_max, positions, 0), axis=1)
+    duration = (positions - last_peak).max(axis=1)
+    return max_drawdown, duration
+
+def daily_turnover(holdings):
+    """
+    One-way turnover per day, 0.5 * sum(|w_t - w_t-1|), of portfolios x days x symbols holdings
+    (weights as from top_n_holdings, or 0/1 membership which is read as equal weights).
+    Days without holdings (no-trade days, where every gain is NaN) carry the previous day's
+    holdings forward, and days before the first holdings take them, so the first purchase and
+    market closures count as 0.
+    """
+    holdings = np.asarray(holdings, dtype=float)
+    if holdings.ndim == 2:
+        holdings = holdings[None]
+    totals = holdings.sum(axis=-1, keepdims=True)
+    weights = np.divide(holdings, totals, out=np.zeros_like(holdings), where=totals > 0)
+    held = totals[..., 0] > 0
+    positions = np.arange(held.shape[1])
+    # Row of the latest day with holdings, or of the first one for the days before it
+    source = np.maximum.accumulate(np.where(held, positions, 0), axis=1)
+    source = np.maximum(source, held.argmax(axis=1)[:, None])
+    weights = weights[np.arange(len(weights))[:, None], source]
+    turnover = np.zeros(weights.shape[:2])
+    turnover[:, 1:] = 0.5 * np.abs(np.diff(weights, axis=1)).sum(axis=-1)
+    return turnover
+
+def mean_trading_day_turnover(holdings):
+    """
+    Mean daily_turnover over the trading days after the first purchase: days with holdings,
+    so weekends and no-trade days, which carry holdings over at zero turnover, do not dilute it.
+    NaN for a portfolio with fewer than two trading days.
+    """
+    holdings = np.asarray(holdings, dtype=float)
+    if holdings.ndim == 2:
+        holdings = holdings[None]
+    trading = holdings.sum(axis=-1) > 0
+    # The first trading day is the initial purchase
+    trading[np.arange(len(trading)), trading.argmax(axis=1)] = False
+    counts = trading.sum(axis=1)
+    totals = np.where(trading, daily_turnover(holdings), 0.0).sum(axis=1)
+    return np.where(counts > 0, totals / np.maximum(counts, 1), np.nan)
+
+def compute_risk_metrics(values, holdings=None, initial=1.0, risk_free_rate=0.0, periods_per_year=TRADING_DAYS):
+    """
+    Risk and return metrics for many value paths in one vectorized pass.
+    values is portfolios x days (a single path is treated as one portfolio); holdings is the
+    matching portfolios x days x symbols array from top_n_holdings, needed only for turnover.
+    risk_free_rate is annual; pass periods_per_year=infer_periods_per_year(dates) for paths that
+    are not one entry per trading day. Returns a DataFrame with one row per portfolio and METRIC_COLUMNS:
+    total_return, cagr, volatility, max_drawdown and turnover (one-way, mean over trading days) as fractions,
+    annualized sharpe and sortino ratios, and max_drawdown_duration in periods.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    n_portfolios, n_periods = values.shape
+    returns = period_returns(values, initial)
+    excess = returns - risk_free_rate / periods_per_year
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = values[:, -1] / initial if n_periods else np.full(n_portfolios, np.nan)
+        total_return = growth - 1
+        cagr = growth ** (periods_per_year / n_periods) - 1 if n_periods else growth
+        std = returns.std(axis=1, ddof=1) if n_periods > 1 else np.full(n_portfolios, np.nan)
+        downside = np.sqrt((np.minimum(excess, 0.0) ** 2).mean(axis=1))
+        mean_excess = excess.mean(axis=1)
+        sharpe = np.where(std > 0, mean_excess / std * np.sqrt(periods_per_year), np.nan)
+        sortino = np.where(downside > 0, mean_excess / downside * np.sqrt(periods_per_year), np.nan)
+    max_drawdown, duration = drawdown_stats(values, initial)
+    turnover = mean_trading_day_turnover(holdings) if holdings is not None else np.full(n_portfolios, np.nan)
+    return pd.DataFrame({
+        'total_return': total_return,
+        'cagr': cagr,
+        'volatility': std * np.sqrt(periods_per_year),
+        'sharpe': sharpe,
+        'sortino': sortino,
+        'max_drawdown': max_drawdown,
+        'max_drawdown_duration': duration,
+        'turnover': turnover,
+    }, columns=METRIC_COLUMNS)
+
+def format_risk_metrics(metrics, labels):
+    """Report lines, one per portfolio, for a compute_risk_metrics table."""
+    lines = []
+    for label, (_, row) in zip(labels, metrics.iterrows()):
+        turnover = 'n/a' if np.isnan(row['turnover']) else f"{row['turnover'] * 100:.2f}%"
+        lines.append(
+            f"{label}: Total return {row['total_return'] * 100:.2f}%, CAGR {row['cagr'] * 100:.2f}%, "
+            f"Volatility {row['volatility'] * 100:.2f}%, Sharpe {row['sharpe']:.2f}, Sortino {row['sortino']:.2f}, "
+            f"Max drawdown {row['max_drawdown'] * 100:.2f}% ({int(row['max_drawdown_duration'])} periods), "
+            f"Daily turnover {turnover}"
+        )
+    return lines
@@ -0,0 +1,36 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+def publish_arrays(arrays):
+    """
+    Copy each named array into its own shared memory block.
+    Returns (blocks, spec): keep blocks alive in the publishing process and pass the
+    picklable spec to attach_arrays in the workers.
+    """
+    blocks = []
+    spec = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        spec[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, spec
+
+def attach_arrays(spec):
+    """Attach to published arrays as read-only views, without copying."""
+    blocks = []
+    arrays = {}
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.flags.writeable = False
+        blocks.append(block)
+        arrays[name] = array
+    return blocks, arrays
+
+def release_arrays(blocks, unlink=True):
+    for block in blocks:
+        block.close()
+        if unlink:
+            block.unlink()
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from feature_engineering import FeatureTensor, prune_feature_tensor
+from portfolio_simulation import simulate_portfolio_matrix
+
+TOP_N = 10
+
+def random_tensor(seed=0, n_dates=30, n_symbols=40):
+    rng = np.random.default_rng(seed)
+    features = rng.random((n_dates, n_symbols, 4))
+    gains = rng.normal(0, 2, (n_dates, n_symbols))
+    features[:, -3:] = np.nan  # symbols without a row that day
+    return FeatureTensor(None, None, features, gains)
+
+def total_gain(tensor, weights):
+    scores = tensor.features @ weights
+    return simulate_portfolio_matrix(scores, tensor.gains, top_n=TOP_N)[-1]
+
+def test_prune_drops_only_dominated_cells():
+    tensor = random_tensor()
+    pruned = prune_feature_tensor(tensor, TOP_N)
+    assert pruned.features.shape[1] < tensor.features.shape[1]
+    for weights in np.random.default_rng(1).random((20, 4)):
+        assert np.isclose(total_gain(tensor, weights), total_gain(pruned, weights))
+
+def test_prune_keeps_tied_leaders():
+    # top_n + 1 identical cells beat every other cell; none of them dominates another
+    tensor = random_tensor()
+    tensor.features[:, :TOP_N + 1] = 2.0
+    tensor.gains[:, :TOP_N + 1] = 1.0
+    pruned = prune_feature_tensor(tensor, TOP_N)
+    assert (~np.isnan(pruned.features[..., 0])).sum(axis=1).min() == TOP_N + 1
+    for weights in np.random.default_rng(2).random((20, 4)):
+        assert np.isclose(total_gain(tensor, weights), total_gain(pruned, weights))
+
+def test_prune_keeps_days_with_few_candidates():
+    tensor = random_tensor(n_symbols=8)
+    pruned = prune_feature_tensor(tensor, TOP_N)
+    np.testing.assert_array_equal(pruned.features[:, :5], tensor.features[:, :5])
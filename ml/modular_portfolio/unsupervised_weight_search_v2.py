@@ -1,59 +1,139 @@
 import numpy as np
-from scipy.optimize import differential_evolution
-from feature_engineering import add_score_column, aggregate_scores, filter_date_range
-from portfolio_simulation import simulate_portfolio
+from feature_engineering import FeatureTensor, build_feature_tensor, score_feature_tensor, score_feature_tensor_batch, prune_feature_tensor
+from portfolio_simulation import simulate_portfolio_matrix
+from shared_dataset import publish_arrays, attach_arrays, release_arrays
+from evaluation_cache import DEFAULT_CACHE_PATH, EvaluationCache, dataset_fingerprint
 import pandas as pd
-import multiprocessing
 import gc
 
-# Caching for expensive gain calculations
-gain_cache = {}
-
-def calc_total_gain(weights, df):
-    key = tuple(np.round(weights, 8))
-    if key in gain_cache:
-        gain = gain_cache[key]
-        print(f"[CACHE] Objective called with weights={weights}, gain={gain}")
-        return gain
-    df = add_score_column(
-        df,
-        weights[0], weights[1], weights[2], weights[3],
-        score_col='score')
-    agg_df = aggregate_scores(df, score_columns='score')
-    agg_df = filter_date_range(agg_df, pd.to_datetime('2024-06-01'), pd.to_datetime('2025-05-31'))
-    dates, values = simulate_portfolio(agg_df, top_n=10, allocation='equal')
+START_DATE = pd.to_datetime('2024-06-01')
+END_DATE = pd.to_datetime('2025-05-31')
+
+TOP_N = 10
+ALLOCATION = 'equal'
+# Candidates simulated per array pass in batched_objective, bounding its working memory
+BATCH_SIZE = 16
+# Fixed seed so a re-run proposes the same candidates and is served from the evaluation cache
+DEFAULT_SEED = 42
+# differential_evolution settings shared with walk_forward.optimize_weights
+DE_OPTIONS = dict(polish=True, updating='deferred', popsize=15, maxiter=100)
+
+# Read-only tensor attached from shared memory in each pool worker
+_worker_blocks = None
+_worker_tensor = None
+_worker_cache = None
+
+def calc_total_gain(weights, tensor, cache=None):
+    # Cached evaluations are shared by all workers and persist across runs
+    values = None
+    if cache is not None:
+        values = cache.get(weights, TOP_N, ALLOCATION, START_DATE, END_DATE)
+        if values is not None:
+            gain = (values[-1] - 1.0) * 100 if len(values) > 0 else None
+            print(f"[CACHE] Objective called with weights={weights}, gain={gain}")
+            return gain
+    scores = score_feature_tensor(tensor, weights)
+    values = simulate_portfolio_matrix(scores, tensor.gains, top_n=TOP_N, allocation=ALLOCATION)
+    if cache is not None:
+        cache.put(weights, TOP_N, ALLOCATION, START_DATE, END_DATE, values)
     if len(values) > 0:
-        total_gain = (values[-1] - 1.0) * 100
-        gain_cache[key] = total_gain
-        return total_gain
-    gain_cache[key] = None
+        return (values[-1] - 1.0) * 100
     return None
 
-def objective(weights, merged_df):
-    df = merged_df.copy()
-    gain = calc_total_gain(weights, df)
-    del df
+def objective(weights, tensor, cache=None):
+    gain = calc_total_gain(weights, tensor, cache)
     print(f"Objective called with weights={weights}, gain={gain if gain is not None else 'None (penalty applied)'}")
     if gain is None:
         return 1e6
     return -gain
 
-def find_best_vector(merged_df):
+def batched_objective(weight_matrix, tensor, cache=None, top_n=TOP_N, allocation=ALLOCATION, verbose=True):
+    """
+    Population form of objective for differential_evolution(vectorized=True).
+    Takes a (4, P) weight matrix and returns the P objective values; all uncached
+    candidates are scored with one matrix product and simulated in one array pass.
+    top_n and allocation other than TOP_N and ALLOCATION need cache=None, as cache entries
+    are keyed on this module's settings.
+    """
+    weight_matrix = np.asarray(weight_matrix, dtype=float).reshape(4, -1)
+    candidates = weight_matrix.T
+    gains = np.full(len(candidates), np.nan)
+    pending = []
+    for i, weights in enumerate(candidates):
+        values = cache.get(weights, top_n, allocation, START_DATE, END_DATE) if cache is not None else None
+        if values is None:
+            pending.append(i)
+        elif len(values) > 0:
+            gains[i] = (values[-1] - 1.0) * 100
+    for start in range(0, len(pending), BATCH_SIZE):
+        batch = pending[start:start + BATCH_SIZE]
+        scores = score_feature_tensor_batch(tensor, weight_matrix[:, batch])
+        values = simulate_portfolio_matrix(scores, tensor.gains, top_n=top_n, allocation=allocation)
+        for i, path in zip(batch, values):
+            if cache is not None:
+                cache.put(candidates[i], top_n, allocation, START_DATE, END_DATE, path)
+            if len(path) > 0:
+                gains[i] = (path[-1] - 1.0) * 100
+    if verbose:
+        print(f"Batched objective: {len(candidates)} candidates ({len(candidates) - len(pending)} cached), "
+              f"best gain={np.nanmax(gains) if not np.isnan(gains).all() else 'None'}")
+    return np.where(np.isnan(gains), 1e6, -gains)
+
+def _init_worker(spec, cache):
+    global _worker_blocks, _worker_tensor, _worker_cache
+    _worker_blocks, arrays = attach_arrays(spec)
+    _worker_tensor = FeatureTensor(None, None, arrays['features'], arrays['gains'])
+    _worker_cache = cache
+
+def shared_objective(weights):
+    return objective(weights, _worker_tensor, _worker_cache)
+
+def find_best_vector(merged_df, workers=None, use_shared_memory=True, cache_path=DEFAULT_CACHE_PATH,
+                     seed=DEFAULT_SEED, vectorized=False, feature_df=None):
+    # Imported here so pool workers, which only need the objective, skip SciPy's import cost
+    import multiprocessing
+    from scipy.optimize import differential_evolution
     cpu_count = multiprocessing.cpu_count()
     print(f"CPU count: {cpu_count}")
+    workers = workers or cpu_count
+    # Aggregate the merged rows once; every evaluation then only needs a matrix-vector product
+    tensor = build_feature_tensor(merged_df, START_DATE, END_DATE, feature_df=feature_df)
+    # Fingerprint the unpruned tensor, as compare_portfolio_metrics.py does, so both share cache entries
+    cache = EvaluationCache(dataset_fingerprint(tensor), cache_path) if cache_path else None
+    if vectorized:
+        # Weights are bounded to [0, 1], so symbols that can never reach the top N are dropped up
+        # front. Only the batched search prunes: see prune_feature_tensor on ties at the cutoff.
+        tensor = prune_feature_tensor(tensor, TOP_N)
+        gc.collect()
     bounds = [(0, 1)] * 4  # 4 weights
+    de_kwargs = dict(DE_OPTIONS, disp=True, seed=seed)
     print("Running global optimization with differential_evolution...")
-    result = differential_evolution(
-        objective,
-        bounds,
-        args=(merged_df,),  # keep comma so interpreted as tuple instead of object
-        polish=True,
-        disp=True,
-        updating='deferred',
-        workers=cpu_count,  # Use single worker to avoid memory issues
-        popsize=15,
-        maxiter=100,
-    )
+    if vectorized:
+        # One array pass per generation replaces the per-candidate calls, so no worker pool is needed
+        result = differential_evolution(
+            batched_objective,
+            bounds,
+            args=(tensor, cache),
+            vectorized=True,
+            **de_kwargs,
+        )
+    elif use_shared_memory and workers > 1:
+        # Publish the tensor once; workers attach read-only at start-up instead of
+        # receiving a pickled copy with every batch of candidates
+        blocks, spec = publish_arrays({'features': tensor.features, 'gains': tensor.gains})
+        try:
+            with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(spec, cache)) as pool:
+                result = differential_evolution(shared_objective, bounds, workers=pool.map, **de_kwargs)
+        finally:
+            release_arrays(blocks)
+    else:
+        result = differential_evolution(
+            objective,
+            bounds,
+            args=(tensor, cache),
+            workers=workers,
+            **de_kwargs,
+        )
     print("Best weights found (unsupervised optimization):", result.x)
     print("Actual total gain with optimized weights:", -result.fun)
     return result.x, -result.fun
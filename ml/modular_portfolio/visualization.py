@@ -41,3 +41,8 @@ def plot_max_drawdown_bar(top_ns, eq_drawdowns, prop_drawdowns, out_path):
     plt.tight_layout()
     plt.savefig(out_path)
     plt.close()
+
+def plot_sweep_max_drawdown(results, out_path):
+    """plot_max_drawdown_bar for a portfolio_simulation.sweep_portfolios results table."""
+    drawdowns = results.pivot(index='top_n', columns='allocation', values='max_drawdown')
+    plot_max_drawdown_bar(list(drawdowns.index), drawdowns['equal'].tolist(), drawdowns['proportional'].tolist(), out_path)
@@ -0,0 +1,96 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from feature_engineering import FeatureTensor, prune_feature_tensor, score_feature_tensor
+from portfolio_simulation import simulate_portfolio_matrix
+from unsupervised_weight_search_v2 import DEFAULT_SEED, DE_OPTIONS, batched_objective
+
+# Tensor shared with fold workers, set once per process by _init_worker
+_worker_tensor = None
+
+def walk_forward_folds(dates, train_months=12, test_months=1, step_months=None):
+    """
+    Return (train_start, train_end, test_start, test_end) windows sliding across dates.
+    Windows are calendar-month based; test windows do not overlap when step_months
+    equals test_months (the default).
+    """
+    step_months = step_months or test_months
+    first, last = pd.Timestamp(min(dates)).normalize(), pd.Timestamp(max(dates))
+    folds = []
+    train_start = first
+    while True:
+        test_start = train_start + pd.DateOffset(months=train_months)
+        if test_start > last:
+            break
+        test_end = min(test_start + pd.DateOffset(months=test_months) - pd.Timedelta(days=1), last)
+        folds.append((train_start, test_start - pd.Timedelta(days=1), test_start, test_end))
+        train_start = train_start + pd.DateOffset(months=step_months)
+    return folds
+
+def slice_tensor(tensor, start_date, end_date):
+    mask = (tensor.dates >= start_date) & (tensor.dates <= end_date)
+    return FeatureTensor(tensor.dates[mask], tensor.symbols, tensor.features[mask], tensor.gains[mask])
+
+def optimize_weights(tensor, top_n=10, allocation='equal', seed=DEFAULT_SEED, x0=None,
+                     maxiter=DE_OPTIONS['maxiter'], popsize=DE_OPTIONS['popsize']):
+    """Find the weights maximizing total gain over tensor with find_best_vector's vectorized search."""
+    # Imported here so main.py --walk-forward does not pay for SciPy before it is needed
+    from scipy.optimize import differential_evolution
+    result = differential_evolution(
+        batched_objective,
+        [(0, 1)] * 4,
+        args=(tensor, None, top_n, allocation, False),
+        vectorized=True,
+        **dict(DE_OPTIONS, seed=seed, x0=x0, maxiter=maxiter, popsize=popsize),
+    )
+    return result.x, -result.fun
+
+def _init_worker(tensor):
+    global _worker_tensor
+    _worker_tensor = tensor
+
+def _run_fold(task):
+    (train_start, train_end, test_start, test_end), top_n, allocation, seed, x0, maxiter, popsize = task
+    train = slice_tensor(_worker_tensor, train_start, train_end)
+    test = slice_tensor(_worker_tensor, test_start, test_end)
+    weights, train_gain = optimize_weights(train, top_n, allocation, seed, x0, maxiter, popsize)
+    values = simulate_portfolio_matrix(score_feature_tensor(test, weights), test.gains, top_n=top_n, allocation=allocation)
+    return weights, train_gain, list(test.dates), values
+
+def walk_forward(tensor, train_months=12, test_months=1, step_months=None, top_n=10, allocation='equal',
+                 workers=None, seed=DEFAULT_SEED, x0=None, maxiter=DE_OPTIONS['maxiter'], popsize=DE_OPTIONS['popsize']):
+    """
+    Walk-forward backtest over a full-range FeatureTensor.
+    Weights are re-optimized on each train window and applied to the following test window;
+    folds run in parallel and all slice the same precomputed tensor, which is pruned once
+    for top_n (pruning is per day, so it holds for every window). x0 warm-starts every fold.
+    Returns (dates, values, folds): the stitched out-of-sample equity curve and a table with
+    each fold's windows, weights, in-sample gain and out-of-sample gain (%).
+    """
+    folds = walk_forward_folds(tensor.dates, train_months, test_months, step_months)
+    if not folds:
+        raise ValueError('Not enough data for one train and test window')
+    tensor = prune_feature_tensor(tensor, top_n)
+    tasks = [(fold, top_n, allocation, seed, x0, maxiter, popsize) for fold in folds]
+    workers = min(workers or multiprocessing.cpu_count(), len(tasks))
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(tensor,)) as executor:
+            results = list(executor.map(_run_fold, tasks))
+    else:
+        _init_worker(tensor)
+        results = [_run_fold(task) for task in tasks]
+    dates, daily_factors, rows = [], [], []
+    for (train_start, train_end, test_start, test_end), (weights, train_gain, test_dates, values) in zip(folds, results):
+        # Each test path starts from 1.0, so its day-over-day ratios chain into one curve
+        path = np.concatenate(([1.0], values))
+        dates.extend(test_dates)
+        daily_factors.append(path[1:] / path[:-1])
+        rows.append({
+            'train_start': train_start, 'train_end': train_end,
+            'test_start': test_start, 'test_end': test_end,
+            'weights': weights, 'train_gain': train_gain,
+            'test_gain': (values[-1] - 1.0) * 100 if len(values) > 0 else np.nan,
+        })
+    values = np.cumprod(np.concatenate(daily_factors)) if daily_factors else np.array([])
+    return dates, values, pd.DataFrame(rows)
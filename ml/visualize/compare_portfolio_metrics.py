@@ -5,17 +5,15 @@ import os
 MODULAR_PORTFOLIO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'modular_portfolio'))
 sys.path.insert(0, MODULAR_PORTFOLIO_DIR)
 
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from data_loader import load_and_merge_data
-from feature_engineering import add_score_column, aggregate_scores, filter_date_range
-from portfolio_simulation import simulate_portfolio, calculate_daily_change, calculate_max_drawdown, calculate_drawdown_series
+# NumPy, pandas, matplotlib and the modular_portfolio modules are imported in main(), after the
+# arguments are parsed, so --help does not pay for them
 
 # Paths (adjust if needed)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 SENTIMENTS_PATH = os.path.join(BASE_DIR, 'data', 'sentiments_processed.csv')
 PRICES_PATH = os.path.join(BASE_DIR, 'data', 'prices_agg.csv')
+# Price store from calculate_daily_gains.py; used instead of PRICES_PATH when present
+PRICE_STORE_PATH = os.path.join(BASE_DIR, 'data', 'prices_store')
 SPX_PATH = os.path.join(BASE_DIR, 'data', 'spx_prices.csv')
 REQUIRED_HEADERS = [
     'OwnerID', 'CreateTime', 'PlayerLevel', 'TwoYearGain', 'MonthsActive',
@@ -24,8 +22,8 @@ REQUIRED_HEADERS = [
 
 # Weight vectors to compare
 VECTORS = [
-    np.array([0.70185104, 0.80219342, 0.68594314, 0.13002897]),
-    np.array([1, 1, 1, 1])
+    [0.70185104, 0.80219342, 0.68594314, 0.13002897],
+    [1, 1, 1, 1]
 ]
 VECTOR_LABELS = [
     'Optimized [0.70, 0.80, 0.69, 0.13]',
@@ -33,18 +31,36 @@ VECTOR_LABELS = [
 ]
 
 # Date range (adjust as needed)
-START_DATE = pd.to_datetime('2024-06-01')
-END_DATE = pd.to_datetime('2025-05-31')
+START_DATE = '2024-06-01'
+END_DATE = '2025-05-31'
 
 def main():
-    merged_df = load_and_merge_data(SENTIMENTS_PATH, PRICES_PATH, REQUIRED_HEADERS)
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Compare the weight vectors in VECTORS against the SPX index over START_DATE..END_DATE. '
+                    'Writes the comparison plots, max_drawdown_values.txt and risk_metrics.txt to the current directory.')
+    parser.parse_args()
+    import numpy as np
+    import pandas as pd
+    import matplotlib.pyplot as plt
+    from data_loader import load_and_merge_data, DEFAULT_CACHE_DIR
+    from price_store import is_price_store
+    from feature_engineering import build_feature_tensor, score_feature_tensor
+    from portfolio_simulation import calculate_daily_change, top_n_holdings
+    from risk_metrics import compute_risk_metrics, format_risk_metrics, infer_periods_per_year
+    from evaluation_cache import EvaluationCache, dataset_fingerprint, simulate_cached
+    start_date, end_date = pd.to_datetime(START_DATE), pd.to_datetime(END_DATE)
+    prices_path = PRICE_STORE_PATH if is_price_store(PRICE_STORE_PATH) else PRICES_PATH
+    merged_df = load_and_merge_data(SENTIMENTS_PATH, prices_path, REQUIRED_HEADERS, cache_dir=DEFAULT_CACHE_DIR)
+    tensor = build_feature_tensor(merged_df, start_date, end_date)
+    # Evaluations shared with the optimizer in main.py, so known vectors are not re-simulated
+    cache = EvaluationCache(dataset_fingerprint(tensor))
     results = []
-    for vec, label in zip(VECTORS, VECTOR_LABELS):
-        df = add_score_column(merged_df.copy(), *vec)
-        agg_df = aggregate_scores(df)
-        agg_df = filter_date_range(agg_df, START_DATE, END_DATE)
-        temp_df = agg_df[['date', 'Symbol', 'score', 'daily_gain']].copy()
-        dates, values = simulate_portfolio(temp_df, top_n=10, allocation='equal')
+    holdings = []
+    for vec, label in zip(map(np.array, VECTORS), VECTOR_LABELS):
+        dates = list(tensor.dates)
+        values = simulate_cached(tensor, vec, 10, 'equal', start_date, end_date, cache)
+        holdings.append(top_n_holdings(score_feature_tensor(tensor, vec), tensor.gains, 10, 'equal'))
         daily_gains = calculate_daily_change(values)
         # Calculate drawdown series over time
         drawdown_series = 1 - (np.array(values) / np.maximum.accumulate(values))
@@ -61,7 +77,7 @@ def main():
     # Add SPX index
     spx_df = pd.read_csv(SPX_PATH)
     spx_df['Date'] = pd.to_datetime(spx_df['Date'])
-    spx_df = spx_df[(spx_df['Date'] >= START_DATE) & (spx_df['Date'] <= END_DATE)]
+    spx_df = spx_df[(spx_df['Date'] >= start_date) & (spx_df['Date'] <= end_date)]
     spx_df = spx_df.sort_values('Date')
     spx_close = spx_df['Close'].to_numpy()
     spx_dates = spx_df['Date'].to_list()
@@ -125,5 +141,15 @@ def main():
             f.write(f"{res['label']}: {res['max_drawdown']*100:.2f}%\n")
     print('Saved: max_drawdown_values.txt')
 
+    # Risk metrics: the weight vectors share dates, so they are computed in one batch. Each series
+    # is annualized at its own frequency (calendar dates for the portfolios, trading days for SPX).
+    portfolio_metrics = compute_risk_metrics(np.stack([res['values'] for res in results[:-1]]), np.stack(holdings),
+                                             periods_per_year=infer_periods_per_year(tensor.dates))
+    spx_metrics = compute_risk_metrics(spx_values, periods_per_year=infer_periods_per_year(spx_dates))
+    with open('risk_metrics.txt', 'w') as f:
+        for line in format_risk_metrics(portfolio_metrics, VECTOR_LABELS) + format_risk_metrics(spx_metrics, ['SPX Index']):
+            f.write(line + '\n')
+    print('Saved: risk_metrics.txt')
+
 if __name__ == '__main__':
     main()
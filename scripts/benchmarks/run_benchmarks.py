@@ -0,0 +1,167 @@
+"""
+run_benchmarks.py
+-----------------
+Times every pipeline stage on synthetic data at several scales and records wall time and peak
+traced memory for each one. Results are appended as JSON lines so runs on different commits can
+be compared on the same machine.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tracemalloc
+import subprocess
+import importlib.util
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.abspath(os.path.join(base_dir, '..', '..'))
+sys.path.insert(0, os.path.join(repo_dir, 'ml', 'modular_portfolio'))
+# NumPy, pandas and the modular_portfolio modules are imported inside the functions that use them,
+# so --help does not pay for them
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s: %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+
+DEFAULT_SCALES = [10_000, 1_000_000, 10_000_000]
+DEFAULT_RESULTS_FILE = os.path.join(base_dir, 'benchmark_results.jsonl')
+process_sentiments_script = os.path.join(repo_dir, 'scripts', 'process sentiments', 'process_sentiments.py')
+SIMULATION_START = '2024-06-01'
+SIMULATION_END = '2025-05-31'
+
+def load_script(path: str, name: str):
+    """Import a pipeline script by path (the script folders contain spaces)."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def run_script_main(module, argv: List[str]) -> None:
+    saved_argv = sys.argv
+    sys.argv = [module.__file__] + argv
+    try:
+        module.main()
+    finally:
+        sys.argv = saved_argv
+
+def measure(func: Callable, with_memory: bool) -> Tuple[float, float, object]:
+    """Run func once for wall time and, if requested, once more under tracemalloc for peak memory (MB)."""
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    peak_mb = None
+    if with_memory:
+        del result
+        tracemalloc.start()
+        try:
+            result = func()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        finally:
+            tracemalloc.stop()
+    return seconds, peak_mb, result
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def benchmark_scale(post_days: int, data_dir: str, with_memory: bool, seed: int) -> List[Dict]:
+    import numpy as np
+    import pandas as pd
+    from synthetic_data import generate_dataset
+    from data_loader import load_and_merge_data
+    from feature_engineering import add_score_column, aggregate_scores, filter_date_range, build_feature_tensor
+    from portfolio_simulation import simulate_portfolio, simulate_portfolio_vectorized
+    import unsupervised_weight_search_v2 as weight_search
+    simulation_start, simulation_end = pd.to_datetime(SIMULATION_START), pd.to_datetime(SIMULATION_END)
+    paths = generate_dataset(os.path.join(data_dir, f'scale_{post_days}'), post_days, seed)
+    process_sentiments = load_script(process_sentiments_script, 'process_sentiments')
+    spread_output = os.path.join(os.path.dirname(paths['sentiments']), 'sentiments_spread.csv')
+    state: Dict[str, object] = {}
+
+    def spreading():
+        run_script_main(process_sentiments, ['--input', paths['sentiments'], '--output', spread_output,
+                                             '--end-date', '2025-05-31'])
+
+    def merge():
+        return load_and_merge_data(paths['sentiments_processed'], paths['prices_agg'])
+
+    def aggregate():
+        df = add_score_column(state['merged'].copy(), 1, 1, 1, 1)
+        return filter_date_range(aggregate_scores(df), simulation_start, simulation_end)
+
+    def simulate():
+        return simulate_portfolio(state['agg'][['date', 'Symbol', 'score', 'daily_gain']], top_n=10, allocation='equal')
+
+    def simulate_vectorized():
+        return simulate_portfolio_vectorized(state['agg'][['date', 'Symbol', 'score', 'daily_gain']], top_n=10, allocation='equal')
+
+    def feature_tensor():
+        return build_feature_tensor(state['merged'], simulation_start, simulation_end)
+
+    def optimizer_generation():
+        # One differential_evolution generation: popsize (15) x 4 weights candidate evaluations
+        candidates = np.random.default_rng(seed).random((15 * 4, 4))
+        return [weight_search.objective(weights, state['tensor']) for weights in candidates]
+
+    stages = [
+        ('spreading', spreading, None),
+        ('merge', merge, 'merged'),
+        ('aggregate_scores', aggregate, 'agg'),
+        ('simulate_portfolio', simulate, None),
+        ('simulate_portfolio_vectorized', simulate_vectorized, None),
+        ('build_feature_tensor', feature_tensor, 'tensor'),
+        ('find_best_vector_generation', optimizer_generation, None),
+    ]
+    results = []
+    for name, func, keep_as in stages:
+        logging.info(f"[{post_days:,} post-days] running {name}...")
+        seconds, peak_mb, result = measure(func, with_memory)
+        if keep_as:
+            state[keep_as] = result
+        peak_text = f", peak {peak_mb:,.1f} MB" if peak_mb is not None else ''
+        logging.info(f"[{post_days:,} post-days] {name}: {seconds:.3f} s{peak_text}")
+        results.append({'scale': post_days, 'stage': name, 'seconds': round(seconds, 4),
+                        'peak_mb': round(peak_mb, 2) if peak_mb is not None else None})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every CrowdAlpha pipeline stage on synthetic data.")
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES, help='Post-day counts to benchmark (default: 10000 1000000 10000000)')
+    parser.add_argument('--data-dir', type=str, default=os.path.join(base_dir, 'data'), help='Where synthetic datasets are written (default: data/ in script directory)')
+    parser.add_argument('--output', type=str, default=DEFAULT_RESULTS_FILE, help='JSON lines file results are appended to (default: benchmark_results.jsonl)')
+    parser.add_argument('--no-memory', action='store_true', default=False, help='Skip the tracemalloc pass that measures peak memory')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic data (default: 0)')
+    args = parser.parse_args()
+    import numpy as np
+    import pandas as pd
+
+    run = {
+        'run_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+    with open(args.output, 'a') as f:
+        for post_days in args.scales:
+            for result in benchmark_scale(post_days, args.data_dir, not args.no_memory, args.seed):
+                f.write(json.dumps({**run, **result}) + '\n')
+                f.flush()
+    logging.info(f"Benchmark results appended to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+synthetic_data.py
+-----------------
+Generates synthetic CrowdAlpha datasets that follow the schemas in data/samples/ at a chosen scale.
+The scale is the number of post-days (rows of sentiments_processed.csv); the raw posts, owners,
+messages and price files are sized to match.
+"""
+import os
+import sys
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s: %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+symbols_file = os.path.join(base_dir, '..', 'ticker parser', 'spx_companies.csv')
+
+PLAYER_LEVELS = ['Bronze', 'Silver', 'Gold', 'Platinum', 'Platinum Plus', 'Diamond']
+PLAYER_LEVEL_WEIGHTS = [0.35, 0.25, 0.18, 0.12, 0.07, 0.03]
+DEFAULT_START_DATE = '2024-01-01'
+DEFAULT_END_DATE = '2025-05-31'
+# Average number of days a post is spread over before the same user posts on the symbol again
+AVG_SPREAD_DAYS = 30
+
+def read_symbols(filepath: str = symbols_file) -> List[str]:
+    return pd.read_csv(filepath)['Symbol'].dropna().astype(str).str.strip().tolist()
+
+def generate_dataset(output_dir: str, post_days: int, seed: int = 0, start_date: str = DEFAULT_START_DATE,
+                     end_date: str = DEFAULT_END_DATE) -> Dict[str, str]:
+    """
+    Write a full synthetic dataset into output_dir and return the paths of the files written:
+    sentiments (process_sentiments input), owners, messages, sentiments_processed, prices_agg
+    and the prices/ directory of per-ticker historical files.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    prices_dir = os.path.join(output_dir, 'prices')
+    os.makedirs(prices_dir, exist_ok=True)
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    symbols = np.array(read_symbols())
+    # Mentions are heavily skewed towards a few popular symbols
+    popularity = 1 / np.arange(1, len(symbols) + 1) ** 1.1
+    popularity /= popularity.sum()
+
+    n_posts = max(1, post_days // AVG_SPREAD_DAYS)
+    n_owners = max(10, n_posts // 20)
+    owner_ids = rng.choice(np.arange(100000, 100000 + 20 * n_owners), size=n_owners, replace=False)
+    owners = pd.DataFrame({
+        'OwnerID': owner_ids,
+        'PlayerLevel': rng.choice(PLAYER_LEVELS, size=n_owners, p=PLAYER_LEVEL_WEIGHTS),
+        'MonthsActive': rng.integers(1, 150, size=n_owners),
+    })
+    two_year_gain = rng.normal(25, 60, size=n_owners).round(2)
+
+    owner_idx = rng.integers(0, n_owners, size=n_posts)
+    span_seconds = int((end - start).total_seconds())
+    create_times = start + pd.to_timedelta(rng.integers(0, span_seconds, size=n_posts), unit='s')
+    posts = pd.DataFrame({
+        'OwnerID': owner_ids[owner_idx],
+        'CreateTime': create_times,
+        'PlayerLevel': owners['PlayerLevel'].to_numpy()[owner_idx],
+        'TwoYearGain': two_year_gain[owner_idx],
+        'MonthsActive': owners['MonthsActive'].to_numpy()[owner_idx],
+        'Symbol': rng.choice(symbols, size=n_posts, p=popularity),
+        'SentimentScore': rng.integers(-2, 3, size=n_posts),
+    }).sort_values('CreateTime', kind='stable')
+
+    paths = {
+        'sentiments': os.path.join(output_dir, 'sentiments.csv'),
+        'owners': os.path.join(output_dir, 'owners.csv'),
+        'messages': os.path.join(output_dir, 'messages.csv'),
+        'sentiments_processed': os.path.join(output_dir, 'sentiments_processed.csv'),
+        'prices_agg': os.path.join(output_dir, 'prices_agg.csv'),
+        'prices_dir': prices_dir,
+    }
+    out = posts.copy()
+    out['CreateTime'] = out['CreateTime'].dt.strftime('%Y-%m-%dT%H:%M:%S.0000000')
+    out.to_csv(paths['sentiments'], index=False)
+    owners.to_csv(paths['owners'], index=False)
+    messages = pd.DataFrame({
+        'OwnerID': posts['OwnerID'].to_numpy(),
+        'MessageText': '$' + posts['Symbol'].to_numpy() + ' ' + rng.choice(['to the moon', 'earnings?', 'selling here', 'long term hold'], size=n_posts),
+        'CreateTime': posts['CreateTime'].dt.strftime('%Y-%m-%d %H:%M:%S.%f').to_numpy(),
+    })
+    messages.to_csv(paths['messages'], index=False)
+
+    # Processed rows: each post repeated over its spread interval, exactly post_days rows in total
+    lengths = rng.geometric(1 / AVG_SPREAD_DAYS, size=n_posts)
+    cumulative = np.cumsum(lengths)
+    n_used = min(int(np.searchsorted(cumulative, post_days)) + 1, n_posts)
+    lengths = lengths[:n_used]
+    lengths[-1] -= lengths.sum() - post_days
+    rows = np.repeat(np.arange(n_used), lengths)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    processed = posts.iloc[rows].reset_index(drop=True)
+    processed['PlayerLevel'] = processed['PlayerLevel'].map({level: i + 1 for i, level in enumerate(PLAYER_LEVELS)})
+    processed['date'] = processed['CreateTime'].dt.normalize() + pd.to_timedelta(offsets, unit='D')
+    processed['daysSincePost'] = offsets
+    processed['CreateTime'] = processed['CreateTime'].dt.strftime('%Y-%m-%d %H:%M:%S+00:00')
+    processed['date'] = processed['date'].dt.strftime('%Y-%m-%d')
+    processed.to_csv(paths['sentiments_processed'], index=False)
+
+    # Prices: a random walk per symbol over business days
+    trading_days = pd.bdate_range(start, end)
+    opens = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, size=(len(trading_days), len(symbols))), axis=0))
+    closes = opens * (1 + rng.normal(0.0005, 0.015, size=opens.shape))
+    for j, symbol in enumerate(symbols):
+        ticker = pd.DataFrame({
+            'date': trading_days.strftime('%m/%d/%Y'),
+            'open': opens[:, j].round(2),
+            'close': closes[:, j].round(2),
+        }).iloc[::-1]
+        ticker.to_csv(os.path.join(prices_dir, f"{symbol.replace('.', '_')}_historical.csv"), index=False)
+    prices_agg = pd.DataFrame({
+        'date': np.repeat(trading_days.strftime('%Y-%m-%d'), len(symbols)),
+        'symbol': np.tile(symbols, len(trading_days)),
+        'daily_gain': ((closes - opens) / opens * 100).ravel(),
+    })
+    prices_agg.to_csv(paths['prices_agg'], index=False)
+    logging.info(f"Generated {n_posts:,} posts, {len(processed):,} post-days and {len(symbols)} price files in {output_dir}")
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic CrowdAlpha dataset.")
+    parser.add_argument('output_dir', type=str, help='Directory to write the dataset to')
+    parser.add_argument('--post-days', type=int, default=10000, help='Number of sentiments_processed rows (default: 10000)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    args = parser.parse_args()
+    generate_dataset(args.output_dir, args.post_days, args.seed)
+
+if __name__ == "__main__":
+    main()
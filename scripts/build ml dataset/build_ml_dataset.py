@@ -4,14 +4,19 @@ build_ml_dataset.py
 Builds a machine learning dataset by merging sentiment data with daily price gains.
 For each row in sentiments_processed.csv, matches a row from prices_agg.csv by date and symbol.
 Adds a 'daily_gain' column (from prices_agg), or 0 if no match is found.
+With --price-store, gains are looked up in the date x symbol price store instead of merged from the CSV.
+With --chunksize, the sentiments file is streamed in chunks and appended to the output, so memory stays bounded.
 """
 import os
-import pandas as pd
-import numpy as np
 import sys
 import logging
 import time
 
+# Shared helpers in scripts/utils
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+# pandas, NumPy and the price store are imported inside the functions that use them, so --help
+# does not pay for them
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,78 +30,152 @@ sentiments_file = os.path.join(base_dir, 'sentiments_processed.csv')
 prices_file = os.path.join(base_dir, 'prices_agg.csv')
 output_file = os.path.join(base_dir, 'ml_dataset.csv')
 
+def stream_ml_dataset(sentiments_path: str, output_path: str, gains: 'PriceStore', chunksize: int) -> dict:
+    """
+    Read the sentiments file in chunks, fill daily_gain from the gains index (0 if no match) and
+    append each chunk to the output. Sentiment fields are passed through as read, unparsed.
+    Returns the dataset statistics, collected chunk by chunk.
+    """
+    import numpy as np
+    import pandas as pd
+    users, symbols = set(), set()
+    min_date, max_date = None, None
+    num_rows = 0
+    header = True
+    reader = pd.read_csv(sentiments_path, chunksize=chunksize, dtype=str, keep_default_na=False)
+    with open(output_path, 'w', newline='') as out:
+        for chunk in reader:
+            dates = pd.to_datetime(chunk['date'])
+            chunk['daily_gain'] = np.nan_to_num(gains.lookup('daily_gain', dates, chunk['Symbol']), nan=0.0)
+            chunk.to_csv(out, index=False, header=header)
+            header = False
+            users.update(chunk['OwnerID'].unique())
+            symbols.update(chunk['Symbol'].unique())
+            if dates.notna().any():
+                min_date = dates.min() if min_date is None else min(min_date, dates.min())
+                max_date = dates.max() if max_date is None else max(max_date, dates.max())
+            num_rows += len(chunk)
+            logging.info(f"Wrote {num_rows:,} rows...")
+    users.discard('')
+    symbols.discard('')
+    return {
+        'num_users': len(users),
+        'min_date': min_date,
+        'max_date': max_date,
+        'num_symbols': len(symbols),
+        'num_rows': num_rows
+    }
+
+def format_date(value) -> str:
+    """Date part of a timestamp, or 'n/a' when there is none (no rows, or only unparseable dates)."""
+    import pandas as pd
+    return 'n/a' if value is None or pd.isna(value) else str(value.date())
+
+def write_stats(stats: dict, start_time: float, save_stats: bool, stats_dir: str = base_dir) -> None:
+    num_users = stats['num_users']
+    min_date = format_date(stats['min_date'])
+    max_date = format_date(stats['max_date'])
+    num_symbols = stats['num_symbols']
+    num_rows = stats['num_rows']
+
+    # Print statistics to log with commas and date only (no time)
+    logging.info(f"Number of users: {num_users:,}")
+    logging.info(f"Date range: {min_date} to {max_date}")
+    logging.info(f"Number of symbols: {num_symbols:,}")
+    logging.info(f"Number of rows in output: {num_rows:,}")
+    # Process run time
+    run_time = time.time() - start_time
+    logging.info(f"Process run time: {run_time:.2f} seconds")
+    # Save statistics to file with commas and date only if requested
+    if save_stats:
+        stats_file = os.path.join(stats_dir, 'ml_dataset_stats.txt')
+        with open(stats_file, 'w') as f:
+            f.write(f"num_users: {num_users:,}\n")
+            f.write(f"min_date: {min_date}\n")
+            f.write(f"max_date: {max_date}\n")
+            f.write(f"num_symbols: {num_symbols:,}\n")
+            f.write(f"num_rows: {num_rows:,}\n")
+            f.write(f"process_run_time_seconds: {run_time:.2f}\n")
+        logging.info(f"Statistics saved to {stats_file}")
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="Build ML dataset by merging sentiments and price gains.")
     parser.add_argument('--save-stats', action='store_true', default=False, help='Save statistics to file (default: False)')
+    parser.add_argument('--price-store', type=str, default=None,
+                        help='Price store directory written by calculate_daily_gains.py, used instead of prices_agg.csv')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Stream the sentiments file in chunks of this many rows, appending each to the output')
+    parser.add_argument('--sentiments', type=str, default=None, help='Processed sentiments CSV (default: sentiments_processed.csv in script directory)')
+    parser.add_argument('--prices', type=str, default=None, help='Daily gains CSV (default: prices_agg.csv in script directory)')
+    parser.add_argument('--output', type=str, default=None, help='Output CSV (default: ml_dataset.csv in script directory)')
     args = parser.parse_args()
+    import pandas as pd
+    from price_store import PriceStore, is_price_store, open_price_store
     start_time = time.time()
+    sentiments_path = args.sentiments or sentiments_file
+    prices_path = args.prices or prices_file
+    output_path = args.output or output_file
 
-    if not os.path.exists(sentiments_file):
-        logging.error(f"Sentiments file not found at {sentiments_file}")
+    if not os.path.exists(sentiments_path):
+        logging.error(f"Sentiments file not found at {sentiments_path}")
         sys.exit(1)
-    if not os.path.exists(prices_file):
-        logging.error(f"Prices file not found at {prices_file}")
+    if args.price_store:
+        if not is_price_store(args.price_store):
+            logging.error(f"Price store not found at {args.price_store}")
+            sys.exit(1)
+    elif not os.path.exists(prices_path):
+        logging.error(f"Prices file not found at {prices_path}")
         sys.exit(1)
+    if args.chunksize:
+        # Streaming mode: only the prices are held in memory, as a date x symbol index
+        if args.price_store:
+            gains = open_price_store(args.price_store)
+        else:
+            gains = PriceStore.from_frame(pd.read_csv(prices_path))
+        stats = stream_ml_dataset(sentiments_path, output_path, gains, args.chunksize)
+        logging.info(f"ML dataset saved to {output_path}")
+        write_stats(stats, start_time, args.save_stats, os.path.dirname(os.path.abspath(output_path)))
+        return
     try:
-        sentiments_df = pd.read_csv(sentiments_file)
-        prices_df = pd.read_csv(prices_file)
+        sentiments_df = pd.read_csv(sentiments_path)
+        prices_df = None if args.price_store else pd.read_csv(prices_path)
     except Exception as e:
         logging.error(f"Failed to read input files: {e}")
         sys.exit(1)
     # Ensure date columns are datetime
     sentiments_df['date'] = pd.to_datetime(sentiments_df['date'])
-    prices_df['date'] = pd.to_datetime(prices_df['date'])
-    # Merge on date and symbol
-    merged_df = pd.merge(
-        sentiments_df,
-        prices_df[['date', 'symbol', 'daily_gain']],
-        how='left',
-        left_on=['date', 'Symbol'],
-        right_on=['date', 'symbol']
-    )
+    if args.price_store:
+        # Join by indexing the date x symbol matrix
+        merged_df = sentiments_df
+        merged_df['daily_gain'] = open_price_store(args.price_store).lookup('daily_gain', merged_df['date'], merged_df['Symbol'])
+    else:
+        prices_df['date'] = pd.to_datetime(prices_df['date'])
+        # Merge on date and symbol
+        merged_df = pd.merge(
+            sentiments_df,
+            prices_df[['date', 'symbol', 'daily_gain']],
+            how='left',
+            left_on=['date', 'Symbol'],
+            right_on=['date', 'symbol']
+        )
+        # Drop the extra 'symbol' column from prices_df
+        merged_df = merged_df.drop(columns=['symbol'])
     # If no match, fill daily_gain with 0
     merged_df['daily_gain'] = merged_df['daily_gain'].fillna(0)
-    # Drop the extra 'symbol' column from prices_df
-    merged_df = merged_df.drop(columns=['symbol'])
     # Save to output
-    merged_df.to_csv(output_file, index=False)
-    logging.info(f"ML dataset saved to {output_file}")
+    merged_df.to_csv(output_path, index=False)
+    logging.info(f"ML dataset saved to {output_path}")
 
     # Statistics collection
-    num_users = merged_df['OwnerID'].nunique() if 'OwnerID' in merged_df.columns else None
-    min_date = merged_df['date'].min()
-    max_date = merged_df['date'].max()
-    num_symbols = merged_df['Symbol'].nunique() if 'Symbol' in merged_df.columns else None
-    num_rows = len(merged_df)
-
     stats = {
-        'num_users': num_users,
-        'min_date': str(min_date),
-        'max_date': str(max_date),
-        'num_symbols': num_symbols,
-        'num_rows': num_rows
+        'num_users': merged_df['OwnerID'].nunique() if 'OwnerID' in merged_df.columns else None,
+        'min_date': merged_df['date'].min(),
+        'max_date': merged_df['date'].max(),
+        'num_symbols': merged_df['Symbol'].nunique() if 'Symbol' in merged_df.columns else None,
+        'num_rows': len(merged_df)
     }
-
-    # Print statistics to log with commas and date only (no time)
-    logging.info(f"Number of users: {num_users:,}")
-    logging.info(f"Date range: {min_date.date()} to {max_date.date()}")
-    logging.info(f"Number of symbols: {num_symbols:,}")
-    logging.info(f"Number of rows in output: {num_rows:,}")
-    # Process run time
-    run_time = time.time() - start_time
-    logging.info(f"Process run time: {run_time:.2f} seconds")
-    # Save statistics to file with commas and date only if requested
-    if args.save_stats:
-        stats_file = os.path.join(base_dir, 'ml_dataset_stats.txt')
-        with open(stats_file, 'w') as f:
-            f.write(f"num_users: {num_users:,}\n")
-            f.write(f"min_date: {min_date.date()}\n")
-            f.write(f"max_date: {max_date.date()}\n")
-            f.write(f"num_symbols: {num_symbols:,}\n")
-            f.write(f"num_rows: {num_rows:,}\n")
-            f.write(f"process_run_time_seconds: {run_time:.2f}\n")
-        logging.info(f"Statistics saved to {stats_file}")
+    write_stats(stats, start_time, args.save_stats, os.path.dirname(os.path.abspath(output_path)))
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,15 @@
 # This script generates sample files for each CSV in the data folder (and one from data/prices), outputting to data/samples.
-# Usage: python generate_csv_samples.py
+# Files are streamed, so with the default head sampling only the first rows of each file are read.
+# Usage: python generate_csv_samples.py [--rows N] [--method {head,reservoir,stratified}] [--key COLUMN] [--max-keys N] [--seed N]
 
+import argparse
+import csv
 import os
-import pandas as pd
+import sys
+
+# Shared helpers in scripts/utils
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from csv_sampling import METHODS, sample_csv as stream_sample
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), '../../data')
 SAMPLES_DIR = os.path.join(DATA_DIR, 'samples')
@@ -11,28 +18,41 @@ SAMPLE_ROWS = 10
 
 os.makedirs(SAMPLES_DIR, exist_ok=True)
 
-def sample_csv(input_path, output_path, n_rows=SAMPLE_ROWS):
+def sample_csv(input_path, output_path, n_rows=SAMPLE_ROWS, method='head', key=None, seed=None, max_keys=None):
     try:
-        df = pd.read_csv(input_path)
-        df.head(n_rows).to_csv(output_path, index=False)
+        # Files without the key column fall back to a plain reservoir sample
+        with open(input_path, encoding='utf-8', newline='') as f:
+            header = next(csv.reader(f), [])
+        if method == 'stratified' and key not in header:
+            method = 'reservoir'
+        stream_sample(input_path, output_path, n_rows, method=method, key=key, seed=seed, max_keys=max_keys)
         print(f"Sampled {input_path} -> {output_path}")
     except Exception as e:
         print(f"Failed to sample {input_path}: {e}")
 
 def main():
+    parser = argparse.ArgumentParser(description='Generate sample files for the CSVs in the data folder')
+    parser.add_argument('--rows', type=int, default=SAMPLE_ROWS, help=f'Rows per sample, or per key value when stratified (default: {SAMPLE_ROWS})')
+    parser.add_argument('--method', choices=METHODS, default='head', help='Sampling method (default: head)')
+    parser.add_argument('--key', default=None, help='Column to stratify by, e.g. Symbol or OwnerID (stratified only)')
+    parser.add_argument('--max-keys', type=int, default=None, help='Keep at most this many random key values (stratified only)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for reservoir and stratified sampling')
+    args = parser.parse_args()
+    options = dict(n_rows=args.rows, method=args.method, key=args.key, seed=args.seed, max_keys=args.max_keys)
+
     # Sample all CSVs in data (except prices)
     for fname in os.listdir(DATA_DIR):
         if fname.endswith('.csv'):
             in_path = os.path.join(DATA_DIR, fname)
             out_path = os.path.join(SAMPLES_DIR, f'sample_{fname}')
-            sample_csv(in_path, out_path)
+            sample_csv(in_path, out_path, **options)
     # Sample one CSV from prices
     if os.path.isdir(PRICES_DIR):
         for fname in os.listdir(PRICES_DIR):
             if fname.endswith('.csv'):
                 in_path = os.path.join(PRICES_DIR, fname)
                 out_path = os.path.join(SAMPLES_DIR, f'sample_{fname}')
-                sample_csv(in_path, out_path)
+                sample_csv(in_path, out_path, **options)
                 break  # Only one file
 
 if __name__ == '__main__':
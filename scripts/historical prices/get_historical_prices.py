@@ -1,11 +1,66 @@
 import argparse
+import os
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-import requests
 from datetime import datetime, timedelta
 import csv
 import json
 
+DEFAULT_BASE_URL = "https://api.nasdaq.com"
+REQUEST_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Accept": "application/json"
+}
+# Status codes worth retrying: rate limited or a server-side failure
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts of up to `capacity`."""
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def make_session(pool_size: int = 10):
+    # One pooled keep-alive session shared by all requests (and worker threads). requests is imported here and
+    # in fetch_historical_data so --help does not pay for it
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(REQUEST_HEADERS)
+    return session
+
+def retry_delay(response, attempt: int, backoff: float):
+    # Honour a numeric Retry-After header, otherwise back off exponentially
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    return backoff * (2 ** attempt)
+
 def get_date_range(from_date: str = None, to_date: str = None):
     # Set new default dates
     DEFAULT_FROM_DATE = '2024-01-01'
@@ -17,33 +72,99 @@ def get_date_range(from_date: str = None, to_date: str = None):
     )
     return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
 
-def fetch_historical_data(ticker: str, from_date: str, to_date: str):
-    url = f"https://api.nasdaq.com/api/quote/{ticker}/historical"
+def fetch_historical_data(ticker: str, from_date: str, to_date: str, session=None,
+                          base_url: str = DEFAULT_BASE_URL, limiter: TokenBucket = None,
+                          retries: int = 0, backoff: float = 1.0, timeout: float = None):
+    url = f"{base_url.rstrip('/')}/api/quote/{ticker}/historical"
     params = {
         "assetclass": "stocks",
         "fromdate": from_date,
         "todate": to_date,
         "limit": 10000
     }
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Accept": "application/json"
-    }
-    
-    response = requests.get(url, params=params, headers=headers)
-    response.raise_for_status()
-    
-    data = response.json()
-    return data.get('data', {}).get('tradesTable', {}).get('rows', [])
+    import requests
+    get = session.get if session is not None else requests.get
 
-def process_tickers(input_file: str, output_folder: str, from_date: str = None, 
-                   to_date: str = None, line_limit: int = None, wait_ms: int = 2000):
-    output_path = Path(output_folder)
-    if output_path.exists() and not output_path.is_dir():
-        raise ValueError(f"Output path '{output_folder}' exists and is not a directory.")
-    output_path.mkdir(parents=True, exist_ok=True)
-    from_date, to_date = get_date_range(from_date, to_date)
-    
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            response = get(url, params=params, headers=REQUEST_HEADERS, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+            time.sleep(retry_delay(None, attempt, backoff))
+            continue
+        if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+            delay = retry_delay(response, attempt, backoff)
+            print(f"{ticker}: HTTP {response.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        response.raise_for_status()
+        data = response.json()
+        return data.get('data', {}).get('tradesTable', {}).get('rows', [])
+
+# Dates as returned by the API and stored in <TICKER>_historical.csv
+STORED_DATE_FORMAT = '%m/%d/%Y'
+
+def price_rows(historical_data):
+    rows = []
+    for row in historical_data:
+        open_price = row.get('open', '').replace('$', '').strip()
+        close_price = row.get('close', '').replace('$', '').strip()
+        rows.append([row.get('date', ''), open_price, close_price])
+    return rows
+
+def write_historical_csv(output_file: Path, rows):
+    with open(output_file, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['date', 'open', 'close'])
+        writer.writerows(rows)
+
+def parse_stored_date(value: str):
+    try:
+        return datetime.strptime(value.strip(), STORED_DATE_FORMAT)
+    except ValueError:
+        return None
+
+def read_historical_csv(output_file: Path):
+    with open(output_file, 'r', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader, None)
+        return [row for row in reader if row]
+
+def last_weekday(date: datetime):
+    while date.weekday() >= 5:
+        date -= timedelta(days=1)
+    return date
+
+def merge_historical_rows(existing_rows, new_rows):
+    # New rows replace stored rows for the same date; newest first like the API response
+    merged = {row[0]: row for row in existing_rows}
+    merged.update({row[0]: row for row in new_rows})
+    return sorted(merged.values(), key=lambda row: parse_stored_date(row[0]) or datetime.min, reverse=True)
+
+def update_ticker(ticker: str, output_file: Path, from_date: str, to_date: str, fetch, incremental: bool = False):
+    # Fetch (from_date, to_date) via fetch() and save it; in incremental mode only the dates after the
+    # last stored one are fetched and merged into the existing file. Returns a status message.
+    if not incremental or not output_file.exists():
+        write_historical_csv(output_file, price_rows(fetch(from_date, to_date)))
+        return f"Data saved to {output_file}"
+
+    existing_rows = read_historical_csv(output_file)
+    stored_dates = [d for d in (parse_stored_date(row[0]) for row in existing_rows) if d is not None]
+    end = datetime.strptime(to_date, '%Y-%m-%d')
+    if stored_dates and max(stored_dates) >= last_weekday(end):
+        return f"{ticker} is up to date"
+    start = max(stored_dates) + timedelta(days=1) if stored_dates else datetime.strptime(from_date, '%Y-%m-%d')
+    new_rows = price_rows(fetch(start.strftime('%Y-%m-%d'), to_date))
+    merged_rows = merge_historical_rows(existing_rows, new_rows)
+    tmp_file = output_file.with_suffix('.tmp')
+    write_historical_csv(tmp_file, merged_rows)
+    os.replace(tmp_file, output_file)
+    return f"Added {len(merged_rows) - len(existing_rows)} rows to {output_file}"
+
+def read_tickers(input_file: str, line_limit: int = None):
     # Read tickers from CSV file with 'Symbol' header
     tickers = []
     with open(input_file, 'r', newline='') as csvfile:
@@ -57,33 +178,78 @@ def process_tickers(input_file: str, output_folder: str, from_date: str = None,
     
     if line_limit is not None:
         tickers = tickers[:line_limit]
+    return tickers
+
+def process_tickers(input_file: str, output_folder: str, from_date: str = None, 
+                   to_date: str = None, line_limit: int = None, wait_ms: int = 2000,
+                   concurrency: int = None, rate: float = 2.0, base_url: str = DEFAULT_BASE_URL,
+                   retries: int = 3, incremental: bool = False, backoff: float = 1.0, timeout: float = 30):
+    output_path = Path(output_folder)
+    if output_path.exists() and not output_path.is_dir():
+        raise ValueError(f"Output path '{output_folder}' exists and is not a directory.")
+    output_path.mkdir(parents=True, exist_ok=True)
+    from_date, to_date = get_date_range(from_date, to_date)
+    tickers = read_tickers(input_file, line_limit)
+
+    if concurrency:
+        process_tickers_concurrent(tickers, output_path, from_date, to_date, concurrency, rate, base_url, retries,
+                                   backoff, timeout, incremental=incremental)
+        return
     
-    for ticker in tickers:
-        ticker = ticker.strip()
-        if not ticker:
-            continue
-            
-        print(f"Processing ticker: {ticker}")
-        output_file = Path(output_folder) / f"{ticker}_historical.csv"
-        
-        try:
-            historical_data = fetch_historical_data(ticker, from_date, to_date)
-            
-            with open(output_file, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(['date', 'open', 'close'])
+    # One ticker at a time over the same keep-alive session, rate limit and retries as concurrent mode
+    session = make_session(1)
+    limiter = TokenBucket(rate)
+    with session:
+        for ticker in tickers:
+            ticker = ticker.strip()
+            if not ticker:
+                continue
                 
-                for row in historical_data:
-                    open_price = row.get('open', '').replace('$', '').strip()
-                    close_price = row.get('close', '').replace('$', '').strip()
-                    writer.writerow([row.get('date', ''), open_price, close_price])
-                    
-            print(f"Data saved to {output_file}")
+            print(f"Processing ticker: {ticker}")
+            output_file = output_path / f"{ticker}_historical.csv"
             
-        except Exception as e:
-            print(f"Error processing {ticker}: {str(e)}")
+            requested = []
+            def fetch(start, end):
+                requested.append(ticker)
+                return fetch_historical_data(ticker, start, end, session=session, base_url=base_url,
+                                             limiter=limiter, retries=retries, backoff=backoff, timeout=timeout)
             
-        time.sleep(wait_ms / 1000)
+            try:
+                print(update_ticker(ticker, output_file, from_date, to_date, fetch, incremental))
+                
+            except Exception as e:
+                print(f"Error processing {ticker}: {str(e)}")
+                
+            # Only wait after tickers that actually hit the API
+            if requested:
+                time.sleep(wait_ms / 1000)
+
+def process_tickers_concurrent(tickers, output_path: Path, from_date: str, to_date: str,
+                               concurrency: int, rate: float, base_url: str = DEFAULT_BASE_URL,
+                               retries: int = 3, backoff: float = 1.0, timeout: float = 30,
+                               incremental: bool = False):
+    # Fetch with a thread pool over one pooled session; the token bucket caps the overall request rate
+    session = make_session(concurrency)
+    limiter = TokenBucket(rate)
+
+    def fetch_and_save(ticker):
+        def fetch(start, end):
+            return fetch_historical_data(ticker, start, end, session=session, base_url=base_url,
+                                         limiter=limiter, retries=retries, backoff=backoff, timeout=timeout)
+        return update_ticker(ticker, output_path / f"{ticker}_historical.csv", from_date, to_date, fetch, incremental)
+
+    failed = []
+    with session, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(fetch_and_save, ticker.strip()): ticker.strip() for ticker in tickers if ticker.strip()}
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                print(future.result())
+            except Exception as e:
+                failed.append(ticker)
+                print(f"Error processing {ticker}: {str(e)}")
+    print(f"Fetched {len(futures) - len(failed)} of {len(futures)} tickers")
+    return failed
 
 def main():
     parser = argparse.ArgumentParser(description='Process stock tickers with configurable parameters')
@@ -93,11 +259,21 @@ def main():
     parser.add_argument('--to-date', help='End date (YYYY-MM-DD)')
     parser.add_argument('--line-limit', type=int, help='Number of lines to process (optional)')
     parser.add_argument('--wait-ms', type=int, default=2000, help='Wait time in milliseconds (default: 2000)')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='Fetch with this many parallel workers instead of one ticker at a time (ignores --wait-ms)')
+    parser.add_argument('--rate', type=float, default=2.0,
+                        help='Maximum requests per second (default: 2)')
+    parser.add_argument('--retries', type=int, default=3,
+                        help='Retries on 429/5xx or connection errors (default: 3)')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL, help=f'API base URL (default: {DEFAULT_BASE_URL})')
+    parser.add_argument('--incremental', action='store_true', default=False,
+                        help='Only fetch dates after the last one already stored for each ticker and merge them in')
     
     args = parser.parse_args()
     
     process_tickers(args.input_file, args.output_folder, args.from_date, 
-                   args.to_date, args.line_limit, args.wait_ms)
+                   args.to_date, args.line_limit, args.wait_ms,
+                   args.concurrency, args.rate, args.base_url, args.retries, args.incremental)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,301 @@
+"""
+run_pipeline.py
+---------------
+Runs the data pipeline (ticker parser -> historical prices -> daily gains, process sentiments,
+then the ML dataset and the portfolio optimizer) as a DAG of stages with declared input and
+output files. Each stage is fingerprinted from the content of its inputs, its script and its
+parameters; stages whose fingerprint and outputs are unchanged since the last run are skipped,
+and stages whose inputs are ready run concurrently (the price and sentiment branches are independent).
+"""
+import os
+import sys
+import json
+import time
+import shlex
+import hashlib
+import logging
+import argparse
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s: %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.abspath(os.path.join(base_dir, '..', '..'))
+scripts_dir = os.path.join(repo_dir, 'scripts')
+DEFAULT_WORK_DIR = os.path.join(repo_dir, 'data', 'pipeline')
+DEFAULT_TICKERS_JSON = os.path.join(scripts_dir, 'ticker parser', 'spx_companies.json')
+STATE_FILE = '.pipeline_state.json'
+
+TICKER_PARSER = os.path.join(scripts_dir, 'ticker parser', 'ticker_parser.py')
+HISTORICAL_PRICES = os.path.join(scripts_dir, 'historical prices', 'get_historical_prices.py')
+DAILY_GAINS = os.path.join(scripts_dir, 'symbol daily gains', 'calculate_daily_gains.py')
+PROCESS_SENTIMENTS = os.path.join(scripts_dir, 'process sentiments', 'process_sentiments.py')
+BUILD_ML_DATASET = os.path.join(scripts_dir, 'build ml dataset', 'build_ml_dataset.py')
+PORTFOLIO_MAIN = os.path.join(repo_dir, 'ml', 'modular_portfolio', 'main.py')
+SHARED_UTILS = [os.path.join(scripts_dir, 'utils', name) for name in ('market_calendar.py', 'price_store.py')]
+
+class Stage:
+    """
+    One pipeline step: a Python script run with args, reading `inputs` and writing `outputs`
+    (files or directories). `code` lists source files that also invalidate the stage when edited.
+    With `stdout`, the script's output is captured to that file (and it may be listed in outputs).
+    """
+    def __init__(self, name: str, script: str, args: List[str], inputs: List[str], outputs: List[str],
+                 code: Optional[List[str]] = None, stdout: Optional[str] = None):
+        self.name = name
+        self.script = script
+        self.args = args
+        self.inputs = inputs
+        self.outputs = outputs
+        self.code = [script] + list(code or [])
+        self.stdout = stdout
+
+    def command(self) -> List[str]:
+        return [sys.executable, self.script] + self.args
+
+class Fingerprints:
+    """
+    Content hashes of files and directories. Hashes are remembered with each file's size and
+    mtime, so unchanged files are not re-read on the next run.
+    """
+    def __init__(self, known: Optional[Dict[str, list]] = None):
+        self.known = dict(known or {})
+        self.lock = threading.Lock()
+
+    def file(self, path: str) -> Optional[str]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        path = os.path.abspath(path)
+        with self.lock:
+            cached = self.known.get(path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        digest = h.hexdigest()
+        with self.lock:
+            self.known[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def path(self, path: str) -> Optional[str]:
+        """Fingerprint a file, or a directory as the hash of its files' relative names and hashes."""
+        if not os.path.isdir(path):
+            return self.file(path)
+        h = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                h.update(os.path.relpath(full, path).encode())
+                h.update((self.file(full) or '').encode())
+        return h.hexdigest()
+
+def stage_key(stage: Stage, fingerprints: Fingerprints) -> str:
+    """Hash of everything that determines a stage's outputs: command, code and input contents."""
+    description = {
+        'args': stage.args,
+        'code': {os.path.relpath(p, repo_dir): fingerprints.path(p) for p in stage.code},
+        'inputs': {p: fingerprints.path(p) for p in stage.inputs},
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+def stage_dependencies(stages: List[Stage]) -> Dict[str, List[str]]:
+    """A stage depends on every stage that produces one of its inputs."""
+    producers = {os.path.abspath(out): stage.name for stage in stages for out in stage.outputs}
+    deps = {}
+    for stage in stages:
+        deps[stage.name] = sorted({producers[os.path.abspath(p)] for p in stage.inputs
+                                   if os.path.abspath(p) in producers and producers[os.path.abspath(p)] != stage.name})
+    return deps
+
+class PipelineRunner:
+    """Schedules stages in dependency order, skipping up-to-date ones, and records results in the state file."""
+    def __init__(self, stages: List[Stage], work_dir: str, workers: int = 2, force=(), dry_run: bool = False):
+        self.stages = {stage.name: stage for stage in stages}
+        self.deps = stage_dependencies(stages)
+        self.work_dir = work_dir
+        self.workers = workers
+        self.force = set(force)
+        self.dry_run = dry_run
+        self.state_path = os.path.join(work_dir, STATE_FILE)
+        self.state = self._load_state()
+        self.fingerprints = Fingerprints(self.state.get('files'))
+        self.lock = threading.Lock()
+
+    def _load_state(self) -> dict:
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path) as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable pipeline state {self.state_path}: {e}")
+        return {'files': {}, 'stages': {}}
+
+    def _save_state(self) -> None:
+        self.state['files'] = self.fingerprints.known
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def is_up_to_date(self, stage: Stage, key: str) -> bool:
+        if 'all' in self.force or stage.name in self.force:
+            return False
+        record = self.state['stages'].get(stage.name)
+        if not record or record.get('key') != key:
+            return False
+        # Outputs must still be the ones this run produced
+        return all(record['outputs'].get(out) is not None and self.fingerprints.path(out) == record['outputs'][out]
+                   for out in stage.outputs)
+
+    def run_stage(self, stage: Stage) -> None:
+        log_path = stage.stdout or os.path.join(self.work_dir, 'logs', f'{stage.name}.log')
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        logging.info(f"[{stage.name}] running: {' '.join(shlex.quote(a) for a in stage.command())}")
+        start = time.time()
+        with open(log_path, 'w') as log:
+            result = subprocess.run(stage.command(), stdout=log, stderr=subprocess.STDOUT, cwd=os.path.dirname(stage.script))
+        if result.returncode != 0:
+            raise RuntimeError(f"exited with code {result.returncode}, see {log_path}")
+        missing = [out for out in stage.outputs if not os.path.exists(out)]
+        if missing:
+            raise RuntimeError(f"did not produce {missing}, see {log_path}")
+        logging.info(f"[{stage.name}] finished in {time.time() - start:.1f}s")
+
+    def run(self) -> bool:
+        """Run the pipeline; returns False if any stage failed (its dependents are not run)."""
+        os.makedirs(self.work_dir, exist_ok=True)
+        done, failed = set(), set()
+        pending = dict(self.deps)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while pending or running:
+                for name in [n for n, deps in pending.items() if all(d in done for d in deps)]:
+                    del pending[name]
+                    stage = self.stages[name]
+                    key = stage_key(stage, self.fingerprints)
+                    if self.is_up_to_date(stage, key):
+                        logging.info(f"[{name}] up to date, skipping")
+                        done.add(name)
+                    elif self.dry_run:
+                        logging.info(f"[{name}] would run")
+                        done.add(name)
+                    else:
+                        running[executor.submit(self.run_stage, stage)] = (name, key)
+                for name in [n for n, deps in pending.items() if any(d in failed for d in deps)]:
+                    del pending[name]
+                    failed.add(name)
+                    logging.error(f"[{name}] not run because an upstream stage failed")
+                if not running:
+                    if pending and not any(all(d in done for d in deps) for deps in pending.values()):
+                        raise RuntimeError(f"Stages with unsatisfiable dependencies: {sorted(pending)}")
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, key = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        failed.add(name)
+                        logging.error(f"[{name}] failed: {e}")
+                        continue
+                    stage = self.stages[name]
+                    with self.lock:
+                        self.state['stages'][name] = {
+                            'key': key,
+                            'outputs': {out: self.fingerprints.path(out) for out in stage.outputs},
+                            'finished': time.strftime('%Y-%m-%d %H:%M:%S'),
+                        }
+                        self._save_state()
+                    done.add(name)
+        if not self.dry_run:
+            self._save_state()
+        return not failed
+
+def build_stages(args) -> List[Stage]:
+    """Declare the pipeline stages and their files under the work directory."""
+    work = os.path.abspath(args.work_dir)
+    tickers_csv = os.path.join(work, 'tickers.csv')
+    prices_dir = os.path.join(work, 'prices')
+    prices_agg = os.path.join(work, 'prices_agg.csv')
+    price_store = os.path.join(work, 'prices_store')
+    sentiments = os.path.abspath(args.sentiments or os.path.join(work, 'sentiments.csv'))
+    sentiments_processed = os.path.join(work, 'sentiments_processed.csv')
+    ml_dataset = os.path.join(work, 'ml_dataset.csv')
+    report = os.path.join(work, 'portfolio_report.txt')
+    # main.py writes its best weights, plots and caches here instead of into the source tree
+    portfolio_dir = os.path.join(work, 'portfolio')
+
+    stages = [
+        Stage('tickers', TICKER_PARSER, [os.path.abspath(args.tickers_json), '--output', tickers_csv],
+              inputs=[os.path.abspath(args.tickers_json)], outputs=[tickers_csv]),
+    ]
+    if not args.no_download:
+        price_args = [tickers_csv, prices_dir, '--from-date', args.from_date, '--to-date', args.to_date]
+        if args.price_concurrency:
+            price_args += ['--concurrency', str(args.price_concurrency)]
+        stages.append(Stage('prices', HISTORICAL_PRICES, price_args, inputs=[tickers_csv], outputs=[prices_dir]))
+    stages += [
+        Stage('gains', DAILY_GAINS,
+              ['--companies', tickers_csv, '--prices-dir', prices_dir, '--output', prices_agg, '--workers', str(args.gain_workers)],
+              inputs=[tickers_csv, prices_dir], outputs=[prices_agg, os.path.splitext(prices_agg)[0] + '.npz', price_store],
+              code=SHARED_UTILS),
+        Stage('sentiments', PROCESS_SENTIMENTS,
+              ['--input', sentiments, '--output', sentiments_processed, '--end-date', args.end_date or args.to_date],
+              inputs=[sentiments], outputs=[sentiments_processed], code=SHARED_UTILS),
+        Stage('ml_dataset', BUILD_ML_DATASET,
+              ['--sentiments', sentiments_processed, '--prices', prices_agg, '--output', ml_dataset, '--chunksize', '1000000'],
+              inputs=[sentiments_processed, prices_agg], outputs=[ml_dataset], code=SHARED_UTILS),
+        Stage('portfolio', PORTFOLIO_MAIN,
+              [sentiments_processed, price_store, '--output-dir', portfolio_dir] + shlex.split(args.portfolio_args),
+              inputs=[sentiments_processed, price_store], outputs=[report, portfolio_dir],
+              code=[os.path.join(os.path.dirname(PORTFOLIO_MAIN), name)
+                    for name in sorted(os.listdir(os.path.dirname(PORTFOLIO_MAIN))) if name.endswith('.py')] + SHARED_UTILS,
+              stdout=report),
+    ]
+    return stages
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the CrowdAlpha data pipeline, skipping stages whose inputs have not changed.")
+    parser.add_argument('--work-dir', type=str, default=DEFAULT_WORK_DIR, help=f'Directory for all stage outputs (default: {DEFAULT_WORK_DIR})')
+    parser.add_argument('--tickers-json', type=str, default=DEFAULT_TICKERS_JSON, help='Ticker JSON for the ticker parser')
+    parser.add_argument('--sentiments', type=str, default=None, help='Raw sentiments CSV (default: sentiments.csv in the work directory)')
+    parser.add_argument('--from-date', type=str, default='2024-01-01', help='Price history start date (YYYY-MM-DD)')
+    parser.add_argument('--to-date', type=str, default='2025-05-31', help='Price history end date (YYYY-MM-DD)')
+    parser.add_argument('--end-date', type=str, default=None, help='Sentiment spreading end date (default: --to-date)')
+    parser.add_argument('--no-download', action='store_true', default=False,
+                        help='Skip the price download stage and use the files already in <work-dir>/prices')
+    parser.add_argument('--price-concurrency', type=int, default=None, help='Concurrent price downloads (default: sequential)')
+    parser.add_argument('--gain-workers', type=int, default=1, help='Processes for the daily gains stage (default: 1)')
+    parser.add_argument('--portfolio-args', type=str, default='', help='Extra arguments for ml/modular_portfolio/main.py, e.g. "--vectorized"')
+    parser.add_argument('--workers', type=int, default=2, help='Stages run concurrently (default: 2)')
+    parser.add_argument('--force', nargs='+', default=[], help="Stages to re-run even if up to date ('all' for every stage)")
+    parser.add_argument('--dry-run', action='store_true', default=False, help='Only report which stages would run')
+    args = parser.parse_args()
+
+    stages = build_stages(args)
+    unknown = set(args.force) - {stage.name for stage in stages} - {'all'}
+    if unknown:
+        logging.error(f"Unknown stages for --force: {sorted(unknown)}")
+        sys.exit(1)
+    start_time = time.time()
+    runner = PipelineRunner(stages, os.path.abspath(args.work_dir), args.workers, args.force, args.dry_run)
+    ok = runner.run()
+    logging.info(f"Pipeline {'finished' if ok else 'failed'} in {time.time() - start_time:.1f}s")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,21 @@ process_sentiments.py
 ---------------------
 Processes sentiment data: groups by OwnerID, sorts by CreateTime, maps PlayerLevel to IDs, and adds daysSincePost column.
 """
+import io
 import os
-import pandas as pd
-import numpy as np
+import hashlib
 import sys
 import logging
 import argparse
+import json
 from datetime import datetime
 from typing import Dict, List, Optional
 
+# Shared helpers in scripts/utils
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+# pandas, NumPy and market_calendar are imported inside the functions that use them, so --help
+# does not pay for them
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -35,6 +41,207 @@ def map_player_level(level: str) -> Optional[int]:
         return None
     return PLAYER_LEVEL_MAP.get(level.strip().lower())
 
+def expand_intervals(df: 'pd.DataFrame', last_date: 'pd.Series', first_date: Optional['pd.Series'] = None) -> 'pd.DataFrame':
+    """
+    Expand each post row into one row per day from first_date (default: the post's own date)
+    through last_date, setting date and daysSincePost. Empty intervals produce no rows.
+    Rows are expanded with repeat/offset arithmetic, without per-row Python objects.
+    """
+    import numpy as np
+    import pandas as pd
+    post_date = df['date']
+    first_date = post_date if first_date is None else first_date
+    lengths = ((last_date - first_date).dt.days + 1).clip(lower=0).to_numpy(dtype=np.int64)
+    start = (first_date - post_date).dt.days.to_numpy(dtype=np.int64)
+    positions = np.repeat(np.arange(len(df)), lengths)
+    offsets = np.arange(len(positions)) - np.repeat(np.cumsum(lengths) - lengths, lengths) + start[positions]
+    spread_df = df.iloc[positions].reset_index(drop=True)
+    spread_df['date'] = spread_df['date'] + pd.to_timedelta(offsets, unit='D')
+    spread_df['daysSincePost'] = offsets
+    return spread_df
+
+def latest_posts(df: 'pd.DataFrame') -> 'pd.DataFrame':
+    """
+    Order posts by OwnerID, Symbol, date and CreateTime, keeping only the latest post
+    per user, symbol and date.
+    """
+    df = df.dropna(subset=['OwnerID', 'Symbol'])
+    df = df.sort_values(['OwnerID', 'Symbol', 'date', 'CreateTime'], kind='stable')
+    return df.drop_duplicates(subset=['OwnerID', 'Symbol', 'date'], keep='last')
+
+def interval_end_dates(df: 'pd.DataFrame', end_date) -> 'pd.Series':
+    """
+    Return the last spread date of each post in a latest_posts frame: the day before the next post
+    in its (OwnerID, Symbol) group, or end_date for the last one.
+    """
+    import pandas as pd
+    next_date = df.groupby(['OwnerID', 'Symbol'], sort=False)['date'].shift(-1)
+    return (next_date - pd.Timedelta(days=1)).fillna(pd.Timestamp(end_date))
+
+def spread_sentiments(df: 'pd.DataFrame', end_date) -> 'pd.DataFrame':
+    """
+    Spread each post over every day from its date until the day before the same user's next post
+    on the symbol, or until end_date for the last one, and add daysSincePost.
+    When a user posts on a symbol several times for the same date, only the latest post spreads.
+    """
+    df = latest_posts(df)
+    return expand_intervals(df, interval_end_dates(df, end_date))
+
+def sentiment_intervals(df: 'pd.DataFrame', end_date) -> 'pd.DataFrame':
+    """
+    Interval-encoded equivalent of spread_sentiments: one row per post with the start_date and
+    end_date (inclusive) it spreads over, instead of one row per day.
+    daysSincePost on a given day is that day minus start_date. Posts that spread over no days are dropped.
+    """
+    df = latest_posts(df)
+    end_dates = interval_end_dates(df, end_date)
+    df = df.rename(columns={'date': 'start_date'})
+    df['end_date'] = end_dates
+    return df[df['end_date'] >= df['start_date']].reset_index(drop=True)
+
+# ---------------------------------------------------------------------------
+# Incremental mode
+# ---------------------------------------------------------------------------
+# Next to the output CSV we keep <output>.state.json (watermark, end date, header, output size,
+# tail offset and how far the input was read) and <output>.open.csv, the last (still open) post of
+# every OwnerID/Symbol pair.
+# Posts newer than the watermark are dated on or after the watermark's trading date, the tail
+# start, so they can only change rows from that date on. The output is written as the final rows
+# followed by the tail (rows dated from the tail start); each run truncates the tail, re-emits the
+# open intervals from the tail start together with the new posts, and writes a new tail.
+
+# Bytes before the read offset hashed to detect an input file that was rewritten, not appended to
+INPUT_CHECK_BYTES = 4096
+
+def state_paths(output_file: str):
+    """Return the state JSON and open-interval CSV paths for an output file."""
+    return output_file + '.state.json', output_file + '.open.csv'
+
+def read_posts(path: str, offset: int = 0):
+    """
+    Read the posts CSV from a row-aligned byte offset (0: the whole file) through its last complete
+    line; a last line without a newline is left for the next run. Returns (df, end offset).
+    """
+    import pandas as pd
+    with open(path, 'rb') as f:
+        header = f.readline()
+        if offset:
+            f.seek(offset)
+        data = f.read()
+    data = data[:data.rfind(b'\n') + 1]
+    return pd.read_csv(io.BytesIO(header + data)), (offset or len(header)) + len(data)
+
+def input_check(path: str, offset: int) -> str:
+    """Hash of the INPUT_CHECK_BYTES bytes before offset."""
+    with open(path, 'rb') as f:
+        f.seek(max(0, offset - INPUT_CHECK_BYTES))
+        return hashlib.sha256(f.read(min(offset, INPUT_CHECK_BYTES))).hexdigest()
+
+def tail_start(watermark) -> 'pd.Timestamp':
+    """First date a post created after watermark can have: the watermark's trading date."""
+    import pandas as pd
+    from market_calendar import effective_trading_date
+    return effective_trading_date(pd.Series([pd.Timestamp(watermark)])).iloc[0]
+
+def split_tail(rows: 'pd.DataFrame', start) -> tuple:
+    """Split spread rows into the final rows dated before start and the tail from start on."""
+    in_tail = rows['date'] >= start
+    return rows[~in_tail], rows[in_tail]
+
+def save_state(output_file: str, open_df: 'pd.DataFrame', watermark, end_date, tail_offset: int,
+               input_file: str, input_offset: int) -> None:
+    """Persist the open intervals, watermark and file offsets for the next incremental run."""
+    import pandas as pd
+    state_file, open_file = state_paths(output_file)
+    open_df.to_csv(open_file, index=False)
+    with open(output_file, newline='') as f:
+        header = f.readline().rstrip('\r\n').split(',')
+    state = {
+        'watermark': pd.Timestamp(watermark).isoformat(),
+        'end_date': str(end_date),
+        'columns': header,
+        'output_size': os.path.getsize(output_file),
+        'tail_offset': tail_offset,
+        'input_offset': input_offset,
+        'input_check': input_check(input_file, input_offset),
+    }
+    with open(state_file, 'w') as f:
+        json.dump(state, f, indent=2)
+
+def load_state(output_file: str, input_file: str) -> Optional[dict]:
+    """
+    Load the incremental state, returning None if it is missing or no longer matches the
+    output file (e.g. the output was rewritten or an earlier append did not finish) or the
+    input file (it was rewritten instead of appended to).
+    """
+    import pandas as pd
+    state_file, open_file = state_paths(output_file)
+    if not all(os.path.exists(p) for p in (output_file, state_file, open_file)):
+        return None
+    try:
+        with open(state_file) as f:
+            state = json.load(f)
+        if os.path.getsize(output_file) != state['output_size']:
+            logging.warning("Output file changed since the last run.")
+            return None
+        if (os.path.getsize(input_file) < state['input_offset']
+                or input_check(input_file, state['input_offset']) != state['input_check']):
+            logging.warning("Input file was rewritten since the last run.")
+            return None
+        open_df = pd.read_csv(open_file)
+        open_df['CreateTime'] = pd.to_datetime(open_df['CreateTime'], utc=True)
+        open_df['date'] = pd.to_datetime(open_df['date'])
+        state['open'] = open_df
+        state['watermark'] = pd.Timestamp(state['watermark'])
+        state['end_date'] = pd.Timestamp(state['end_date'])
+    except Exception as e:
+        logging.warning(f"Could not load incremental state: {e}")
+        return None
+    return state
+
+def spread_incremental(df: 'pd.DataFrame', state: dict, end_date):
+    """
+    Build the new output tail for posts newer than the watermark: the open intervals and the new
+    posts are spread from the previous tail start up to end_date, a same-day new post replacing
+    the open one. Runs in time proportional to the open intervals' tail and the new posts.
+    Returns (rows, open_df, watermark), or None when end_date moves backwards and a full
+    rebuild is needed.
+    """
+    import pandas as pd
+    old_end = state['end_date']
+    end = pd.Timestamp(end_date)
+    if end < old_end:
+        logging.warning(f"End date {end.date()} is before the previous end date {old_end.date()}.")
+        return None
+    new_posts = df[df['CreateTime'] > state['watermark']]
+    posts = latest_posts(pd.concat([state['open'], new_posts], ignore_index=True))
+    first_date = posts['date'].clip(lower=tail_start(state['watermark']))
+    rows = expand_intervals(posts, interval_end_dates(posts, end), first_date)
+    # The latest post of each pair (new or carried over) is the open interval for the next run
+    open_df = posts.drop_duplicates(subset=['OwnerID', 'Symbol'], keep='last')
+    watermark = max(state['watermark'], new_posts['CreateTime'].max()) if not new_posts.empty else state['watermark']
+    return rows, open_df, watermark
+
+def prepare_posts(df: 'pd.DataFrame') -> 'pd.DataFrame':
+    """Drop internal players, map PlayerLevel to IDs and add CreateTime (UTC) and the effective date."""
+    import pandas as pd
+    from market_calendar import effective_trading_date
+    logging.info("Filtering out internal PlayerLevel rows...")
+    # Exclude rows with PlayerLevel 'internal'
+    df = df[df['PlayerLevel'].str.strip().str.lower() != 'internal'].copy()
+    logging.info("Mapping PlayerLevel to IDs...")
+    # Map PlayerLevel to IDs
+    df['PlayerLevel'] = df['PlayerLevel'].apply(map_player_level)
+    if df['PlayerLevel'].isna().any():
+        logging.warning("Some PlayerLevel values could not be mapped to IDs.")
+    logging.info("Converting CreateTime to UTC datetime...")
+    # Convert CreateTime to datetime (UTC)
+    df['CreateTime'] = pd.to_datetime(df['CreateTime'], utc=True)
+    logging.info("Calculating effective date based on NYC 09:30 cutoff...")
+    # Determine 'date' column based on NYC 09:30 cutoff (America/New_York, DST aware)
+    df['date'] = effective_trading_date(df['CreateTime'])
+    return df
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="Process and spread sentiments data.")
@@ -42,8 +249,15 @@ def main():
     parser.add_argument('--output', type=str, default=None, help='Output CSV file (default: sentiments_processed.csv in script directory)')
     parser.add_argument('--end-date', type=str, default=None, help='End date for spreading (YYYY-MM-DD). Defaults to today.')
     parser.add_argument('--save-stats', action='store_true', default=False, help='Save statistics to file (default: False)')
+    parser.add_argument('--format', choices=['rows', 'intervals'], default='rows',
+                        help="Output one row per post per day ('rows', default) or one row per post with "
+                             "start_date/end_date ('intervals')")
+    parser.add_argument('--incremental', action='store_true', default=False,
+                        help='Append only rows for posts newer than the last run, keeping state next to the output '
+                             '(falls back to a full rebuild when there is no usable state)')
     args = parser.parse_args()
     import time
+    import pandas as pd
     start_time = time.time()
 
     # Path definitions (now based on args)
@@ -51,6 +265,10 @@ def main():
     sentiments_file = args.input if args.input else os.path.join(base_dir, 'sentiments.csv')
     output_file = args.output if args.output else os.path.join(base_dir, 'sentiments_processed.csv')
 
+    if args.incremental and args.format != 'rows':
+        logging.error("--incremental is only supported with --format rows.")
+        sys.exit(1)
+
     # Determine end date
     if args.end_date:
         try:
@@ -65,9 +283,15 @@ def main():
     if not os.path.exists(sentiments_file):
         logging.error(f"Sentiments file not found at {sentiments_file}")
         sys.exit(1)
-    logging.info("Reading sentiments file...")
+    state = load_state(output_file, sentiments_file) if args.incremental else None
+    # Incremental runs read only the rows appended since the last run
+    input_offset = state['input_offset'] if state is not None else 0
+    logging.info("Reading sentiments file..." if not input_offset else f"Reading sentiments file from byte {input_offset:,}...")
     try:
-        df = pd.read_csv(sentiments_file)
+        if args.incremental:
+            df, input_end = read_posts(sentiments_file, input_offset)
+        else:
+            df = pd.read_csv(sentiments_file)
     except Exception as e:
         logging.error(f"Failed to read sentiments file: {e}")
         sys.exit(1)
@@ -76,73 +300,56 @@ def main():
     if 'OwnerID' not in df.columns or 'CreateTime' not in df.columns or 'PlayerLevel' not in df.columns:
         logging.error("Required columns missing in sentiments.csv")
         sys.exit(1)
-    logging.info("Filtering out internal PlayerLevel rows...")
-    # Exclude rows with PlayerLevel 'internal'
-    df = df[df['PlayerLevel'].str.strip().str.lower() != 'internal']
-    logging.info("Mapping PlayerLevel to IDs...")
-    # Map PlayerLevel to IDs
-    df['PlayerLevel'] = df['PlayerLevel'].apply(map_player_level)
-    if df['PlayerLevel'].isna().any():
-        logging.warning("Some PlayerLevel values could not be mapped to IDs.")
-    logging.info("Converting CreateTime to UTC datetime...")
-    # Convert CreateTime to datetime (UTC)
-    df['CreateTime'] = pd.to_datetime(df['CreateTime'], utc=True)
-    logging.info("Converting CreateTime to America/New_York timezone...")
-    # Calculate NYC time (America/New_York), adjust for DST
-    df['CreateTime_NYC'] = df['CreateTime'].dt.tz_convert('America/New_York')
-    logging.info("Calculating effective date based on NYC 09:30 cutoff...")
-    # Determine 'date' column based on NYC 09:30 cutoff
-    df['date'] = df['CreateTime_NYC'].apply(
-        lambda dt: dt.date() if (dt.hour < 9 or (dt.hour == 9 and dt.minute < 30))
-        else (dt + pd.Timedelta(days=1)).date()
-    )
-    # Ensure 'date' column is datetime64 for arithmetic
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.drop(columns=['CreateTime_NYC'])
-    logging.info("Sorting and grouping by OwnerID, Symbol, and date...")
-    # Group by OwnerID, Symbol, sort by date
-    df = df.sort_values(['OwnerID', 'Symbol', 'date'])
-    spread_rows = []
-    logging.info("Spreading sentiments for each OwnerID/Symbol group...")
-    for (owner, symbol), group in df.groupby(['OwnerID', 'Symbol']):
-        group = group.sort_values('date')
-        group = group.reset_index(drop=True)
-        group['date'] = pd.to_datetime(group['date'])  # Ensure correct dtype in group
-        for idx, row in group.iterrows():
-            start_date = row['date']
-            if isinstance(idx, (int, np.integer)) and idx < len(group) - 1:
-                next_date = group.loc[idx + 1, 'date']
-                # Convert next_date to pd.Timestamp if not already
-                if not isinstance(next_date, (pd.Timestamp, np.datetime64)):
-                    next_date = pd.Timestamp(str(next_date))
-                last_date = next_date - pd.Timedelta(days=1)
-            else:
-                last_date = end_date
-                if not isinstance(last_date, (pd.Timestamp, np.datetime64)):
-                    last_date = pd.Timestamp(str(last_date))
-            days = (last_date - start_date).days + 1
-            for d in range(days):
-                new_row = row.copy()
-                new_row['date'] = start_date + pd.Timedelta(days=d)
-                new_row['daysSincePost'] = d
-                spread_rows.append(new_row)
-    logging.info("Finished spreading sentiments. Creating final DataFrame...")
-    if spread_rows:
-        final_df = pd.DataFrame(spread_rows)
-        logging.info("Removing duplicates and final sorting...")
-        # Remove duplicates: for each owner, symbol, date, keep only the latest (should already be handled by above logic)
-        final_df = final_df.sort_values(['OwnerID', 'Symbol', 'date', 'CreateTime'])
-        final_df = final_df.drop_duplicates(subset=['OwnerID', 'Symbol', 'date'], keep='last')
-        final_df = final_df.sort_values(['OwnerID', 'Symbol', 'date'])
+    df = prepare_posts(df)
+    if state is not None:
+        result = spread_incremental(df, state, end_date)
+        if result is not None and set(result[0].columns) != set(state['columns']):
+            logging.warning("Input columns differ from the existing output.")
+            result = None
+        if result is not None:
+            rows, open_df, watermark = result
+            final_rows, tail_rows = split_tail(rows, tail_start(watermark))
+            logging.info(f"Rewriting the tail of {output_file}: {len(final_rows):,} final and {len(tail_rows):,} tail rows...")
+            with open(output_file, 'r+b') as f:
+                f.truncate(state['tail_offset'])
+            final_rows.to_csv(output_file, mode='a', header=False, index=False, columns=state['columns'])
+            tail_offset = os.path.getsize(output_file)
+            tail_rows.to_csv(output_file, mode='a', header=False, index=False, columns=state['columns'])
+            save_state(output_file, open_df, watermark, end_date, tail_offset, sentiments_file, input_end)
+            logging.info(f"Process run time: {time.time() - start_time:.2f} seconds")
+            return
+        logging.info("Incremental update not possible; doing a full rebuild.")
+        df, input_end = read_posts(sentiments_file)
+        df = prepare_posts(df)
+    if args.format == 'intervals':
+        logging.info("Building sentiment intervals for each OwnerID/Symbol group...")
+        final_df = sentiment_intervals(df, end_date)
+        logging.info("Finished building sentiment intervals.")
+    else:
+        logging.info("Spreading sentiments for each OwnerID/Symbol group...")
+        final_df = spread_sentiments(df, end_date)
+        logging.info("Finished spreading sentiments.")
+    if not final_df.empty:
         # Save to output
         logging.info("Saving processed sentiments to CSV...")
-        final_df.to_csv(output_file, index=False)
+        if args.incremental:
+            # Final rows first, then the tail the next incremental run rewrites
+            watermark = df['CreateTime'].max()
+            final_rows, tail_rows = split_tail(final_df, tail_start(watermark))
+            final_rows.to_csv(output_file, index=False)
+            tail_offset = os.path.getsize(output_file)
+            tail_rows.to_csv(output_file, mode='a', header=False, index=False)
+            open_df = latest_posts(df).drop_duplicates(subset=['OwnerID', 'Symbol'], keep='last')
+            save_state(output_file, open_df, watermark, end_date, tail_offset, sentiments_file, input_end)
+        else:
+            final_df.to_csv(output_file, index=False)
         logging.info(f"Processed and spread sentiments saved to {output_file}")
 
         # Statistics collection
         num_users = final_df['OwnerID'].nunique() if 'OwnerID' in final_df.columns else None
-        min_date = final_df['date'].min().date() if 'date' in final_df.columns else None
-        max_date = final_df['date'].max().date() if 'date' in final_df.columns else None
+        first_col, last_col = ('start_date', 'end_date') if args.format == 'intervals' else ('date', 'date')
+        min_date = final_df[first_col].min().date() if first_col in final_df.columns else None
+        max_date = final_df[last_col].max().date() if last_col in final_df.columns else None
         num_symbols = final_df['Symbol'].nunique() if 'Symbol' in final_df.columns else None
         num_rows = len(final_df)
 
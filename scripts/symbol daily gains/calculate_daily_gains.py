@@ -2,16 +2,21 @@
 calculate_daily_gains.py
 -----------------------
 Aggregates daily percentage gains for S&P 500 companies from historical price CSVs.
-Outputs a combined CSV with date, symbol, and daily gain.
+Outputs a combined CSV with date, symbol, and daily gain, plus a compact columnar .npz copy
+and a memory-mapped date x symbol price store (see scripts/utils/price_store.py).
 """
 import os
-import pandas as pd
-import numpy as np
 import sys
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from typing import List, Tuple, Optional
 
+# Shared helpers in scripts/utils
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+
+# pandas, NumPy and the price store are imported inside the functions that use them, so --help
+# does not pay for them
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -24,6 +29,11 @@ base_dir = os.path.dirname(os.path.abspath(__file__))
 prices_dir = os.path.join(base_dir, 'prices')
 spx_companies_file = os.path.join(base_dir, 'spx_companies.txt')
 output_file = os.path.join(base_dir, 'prices_agg.csv')
+columnar_output_file = os.path.join(base_dir, 'prices_agg.npz')
+price_store_dir = os.path.join(base_dir, 'prices_store')
+
+# Date format written by get_historical_prices.py
+DEFAULT_DATE_FORMAT = '%m/%d/%Y'
 
 def read_spx_companies(filepath: str) -> List[str]:
     """Read S&P 500 company symbols from a file."""
@@ -36,34 +46,52 @@ def read_spx_companies(filepath: str) -> List[str]:
             line = line.strip()
             if line and not line.startswith('//'):
                 companies.append(line)
+    # Also accept the ticker parser's CSV output, which starts with a 'Symbol' header
+    if companies and companies[0] == 'Symbol':
+        companies = companies[1:]
     if not companies:
         logging.error("No companies found in the SPX file")
         sys.exit(1)
     return companies
 
-def process_company(symbol: str, prices_dir: str) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+def parse_price_column(series: 'pd.Series') -> 'pd.Series':
+    """Parse a price column; read_csv already handled thousands separators unless the column has non-numeric values."""
+    import pandas as pd
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    return pd.to_numeric(series.astype(str).str.replace(',', '', regex=False), errors='coerce')
+
+def parse_dates(series: 'pd.Series', date_format: Optional[str]) -> 'pd.Series':
+    """Parse dates with the explicit format, falling back to format inference for files in another layout."""
+    import pandas as pd
+    if date_format:
+        try:
+            return pd.to_datetime(series, format=date_format)
+        except ValueError:
+            pass
+    return pd.to_datetime(series)
+
+def process_company(symbol: str, prices_dir: str, date_format: Optional[str] = DEFAULT_DATE_FORMAT) -> Tuple[Optional['pd.DataFrame'], Optional[str]]:
     """
     Process a single company's historical price data and return a DataFrame with daily gains.
     Daily gain is calculated as the percentage difference between open and close prices for each day.
-    Returns (result_df, warning_message)
+    Returns (result_df, warning_message); result_df also carries open and close for the price store.
     """
+    import pandas as pd
     file_symbol = symbol.replace('.', '_') if '.' in symbol else symbol
     file_path = os.path.join(prices_dir, f"{file_symbol}_historical.csv")
     if not os.path.exists(file_path):
         return None, f"Warning: Price data for {symbol} not found at {file_path}"
     try:
-        df = pd.read_csv(file_path)
-        # Remove commas from open and close columns if present
-        for col in ['open', 'close']:
-            if col in df.columns:
-                df[col] = df[col].astype(str).str.replace(',', '', regex=False)
+        # thousands=',' parses "1,234.56" prices directly in the C parser
+        df = pd.read_csv(file_path, thousands=',')
         expected_columns = ['date', 'open', 'close']
         missing_columns = [col for col in expected_columns if col not in df.columns]
         if missing_columns:
             return None, f"Required columns missing in {file_path}: {missing_columns}"
-        df['date'] = pd.to_datetime(df['date'])
-        df['open'] = pd.to_numeric(df['open'], errors='coerce')
-        df['close'] = pd.to_numeric(df['close'], errors='coerce')
+        df['date'] = parse_dates(df['date'], date_format)
+        df['open'] = parse_price_column(df['open'])
+        df['close'] = parse_price_column(df['close'])
         warning = None
         if df['open'].isna().any() or df['close'].isna().any():
             warning = f"Warning: {file_symbol} contains missing or non-numeric open/close values"
@@ -72,7 +100,7 @@ def process_company(symbol: str, prices_dir: str) -> Tuple[Optional[pd.DataFrame
         # Calculate daily gain as (close - open) / open * 100
         df['daily_gain'] = (df['close'] - df['open']) / df['open'] * 100
         df['symbol'] = symbol
-        result_df = df[['date', 'symbol', 'daily_gain']]
+        result_df = df[['date', 'symbol', 'open', 'close', 'daily_gain']]
         return result_df, warning
     except pd.errors.EmptyDataError:
         return None, f"Error: Empty data file for {symbol}"
@@ -81,23 +109,70 @@ def process_company(symbol: str, prices_dir: str) -> Tuple[Optional[pd.DataFrame
     except Exception as e:
         return None, f"Fatal error processing {symbol}: {str(e)}"
 
+def process_companies(companies: List[str], prices_dir: str, date_format: Optional[str] = DEFAULT_DATE_FORMAT,
+                      workers: int = 1) -> List[Tuple[str, Optional['pd.DataFrame'], Optional[str]]]:
+    """
+    Run process_company for every symbol, in a process pool when workers > 1.
+    Returns (symbol, result_df, warning) in the order of companies.
+    """
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(companies) // (workers * 4))
+            results = executor.map(process_company, companies, [prices_dir] * len(companies),
+                                   [date_format] * len(companies), chunksize=chunksize)
+            return [(symbol, *result) for symbol, result in zip(companies, results)]
+    return [(symbol, *process_company(symbol, prices_dir, date_format)) for symbol in companies]
+
+def save_columnar(final_df: 'pd.DataFrame', path: str) -> None:
+    """
+    Save the daily gains as a compact columnar .npz: day-resolution dates, codes into a sorted
+    symbols array (the smallest unsigned integer type that holds them) and float64 gains.
+    """
+    import numpy as np
+    import pandas as pd
+    codes, symbols = pd.factorize(final_df['symbol'], sort=True)
+    np.savez(
+        path,
+        date=final_df['date'].to_numpy('datetime64[D]'),
+        symbol_code=codes.astype(np.min_scalar_type(len(symbols))),
+        symbols=np.asarray(symbols, dtype=str),
+        daily_gain=final_df['daily_gain'].to_numpy(dtype=np.float64),
+    )
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="Aggregate daily percentage gains for S&P 500 companies.")
     parser.add_argument('--save-stats', action='store_true', default=False, help='Save statistics to file (default: False)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes reading symbol files in parallel (default: 1)')
+    parser.add_argument('--date-format', type=str, default=DEFAULT_DATE_FORMAT,
+                        help=f"strptime format of the price file dates (default: {DEFAULT_DATE_FORMAT.replace('%', '%%')}); "
+                             "files that do not match fall back to format inference")
+    parser.add_argument('--companies', type=str, default=None, help='Symbols file (default: spx_companies.txt in script directory)')
+    parser.add_argument('--prices-dir', type=str, default=None, help='Directory of <TICKER>_historical.csv files (default: prices/ in script directory)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Output CSV (default: prices_agg.csv in script directory); the .npz copy and prices_store/ go next to it')
     args = parser.parse_args()
     import time
+    import pandas as pd
+    from price_store import write_price_store
     start_time = time.time()
 
-    companies = read_spx_companies(spx_companies_file)
-    if not os.path.exists(prices_dir):
-        logging.error(f"Prices directory not found at {prices_dir}")
+    companies_path = args.companies or spx_companies_file
+    prices_path = args.prices_dir or prices_dir
+    csv_output = args.output or output_file
+    if args.output:
+        columnar_output = os.path.splitext(args.output)[0] + '.npz'
+        store_output = os.path.join(os.path.dirname(os.path.abspath(args.output)), 'prices_store')
+    else:
+        columnar_output, store_output = columnar_output_file, price_store_dir
+    companies = read_spx_companies(companies_path)
+    if not os.path.exists(prices_path):
+        logging.error(f"Prices directory not found at {prices_path}")
         sys.exit(1)
     logging.info(f"Found {len(companies)} companies in SPX list")
     results = []
     warnings = []
-    for symbol in companies:
-        result_df, warning = process_company(symbol, prices_dir)
+    for symbol, result_df, warning in process_companies(companies, prices_path, args.date_format, args.workers):
         if warning:
             warnings.append(warning)
         if result_df is not None:
@@ -110,8 +185,12 @@ def main():
         if final_df.empty:
             logging.error("No data was processed. Results DataFrame is empty.")
             sys.exit(1)
-        final_df.to_csv(output_file, index=False)
-        logging.info(f"Successfully saved all daily gains to {output_file}")
+        final_df[['date', 'symbol', 'daily_gain']].to_csv(csv_output, index=False)
+        logging.info(f"Successfully saved all daily gains to {csv_output}")
+        save_columnar(final_df, columnar_output)
+        logging.info(f"Saved columnar copy to {columnar_output}")
+        write_price_store(store_output, final_df)
+        logging.info(f"Saved price store to {store_output}")
         logging.info(f"Total companies processed: {final_df['symbol'].nunique()}")
 
         # Statistics collection
@@ -129,7 +208,7 @@ def main():
         logging.info(f"Process run time: {run_time:.2f} seconds")
         # Save statistics to file if requested
         if args.save_stats:
-            stats_file = os.path.join(base_dir, 'prices_agg_stats.txt')
+            stats_file = os.path.join(os.path.dirname(os.path.abspath(csv_output)), 'prices_agg_stats.txt')
             with open(stats_file, 'w') as f:
                 f.write(f"min_date: {min_date}\n")
                 f.write(f"max_date: {max_date}\n")
@@ -0,0 +1,117 @@
+"""
+extract_cashtags.py
+-------------------
+Extracts cashtags ($AAPL, $brk_b, ...) from raw social posts and keeps the ones that are
+known symbols, so posts without a tradable symbol never reach the sentiment analyzer.
+The messages CSV (OwnerID, MessageText, CreateTime) is streamed in chunks; each chunk is
+matched with one compiled pattern and validated against the symbol set with a hash lookup.
+"""
+import argparse
+import os
+import re
+import time
+
+from ticker_parser import parse_tickers
+
+# pandas is imported inside the functions that use it, so --help does not pay for it
+
+# A '$' not preceded by a word character, then a symbol starting with a letter (group 1) and an
+# optional one- or two-letter class suffix such as BRK.B / BRK_B (group 2). The suffix must end
+# the word, so '$AAPL.Great' yields AAPL; a suffix that still reads as a word ('$TSLA_to') is
+# dropped when the suffixed symbol is unknown. Prices like $5.00 and '$$' do not match.
+# The lookbehind comes after the literal '$' so the regex engine can scan for '$' first.
+CASHTAG_PATTERN = re.compile(r'\$(?<![\w$]\$)([A-Za-z][A-Za-z0-9]*)([._][A-Za-z]{1,2}\b)?')
+MESSAGE_COLUMNS = ['OwnerID', 'MessageText', 'CreateTime']
+PAIR_COLUMNS = ['PostID', 'OwnerID', 'CreateTime', 'Symbol']
+
+def normalize_symbols(tags: 'pd.Series') -> 'pd.Series':
+    """Upper-case cashtags and write share classes with a dot (brk_b -> BRK.B)."""
+    return tags.str.upper().str.replace('_', '.', regex=False)
+
+def load_symbols(json_path):
+    """Set of normalized symbols from a ticker JSON file such as spx_companies.json."""
+    import pandas as pd
+    return set(normalize_symbols(pd.Series(parse_tickers(json_path), dtype=object)))
+
+def extract_pairs(chunk: 'pd.DataFrame', symbols: set, first_post_id: int = 0) -> 'pd.DataFrame':
+    """
+    Return one (PostID, OwnerID, CreateTime, Symbol) row per distinct valid symbol in each post.
+    PostID is the post's 0-based row number in the messages file.
+    """
+    import pandas as pd
+    text = chunk['MessageText']
+    # Most posts carry no cashtag at all; skip the regex for them
+    candidates = text[text.str.contains('$', regex=False)]
+    matches = candidates.str.extractall(CASHTAG_PATTERN).droplevel('match')
+    if matches.empty:
+        return pd.DataFrame(columns=PAIR_COLUMNS)
+    # Keep the class suffix only when the suffixed symbol is known, otherwise fall back to the base
+    base = normalize_symbols(matches[0])
+    tags = normalize_symbols(matches[0] + matches[1].fillna(''))
+    tags = tags.where(tags.isin(symbols), base)
+    tags = tags[tags.isin(symbols)]
+    pairs = pd.DataFrame({'row': tags.index, 'Symbol': tags.to_numpy()}).drop_duplicates()
+    rows = chunk.loc[pairs['row']]
+    return pd.DataFrame({
+        'PostID': pairs['row'].to_numpy() - chunk.index[0] + first_post_id,
+        'OwnerID': rows['OwnerID'].to_numpy(),
+        'CreateTime': rows['CreateTime'].to_numpy(),
+        'Symbol': pairs['Symbol'].to_numpy(),
+    })
+
+def extract_cashtags(messages_path, symbols, output_path, filtered_path=None, chunksize=500000):
+    """
+    Stream the messages file and write the (post, symbol) pairs to output_path. With filtered_path,
+    also write the posts that have at least one valid symbol, in the input format.
+    Returns counts of posts read, posts kept and pairs written.
+    """
+    import pandas as pd
+    stats = {'posts': 0, 'posts_with_symbols': 0, 'pairs': 0}
+    reader = pd.read_csv(messages_path, usecols=MESSAGE_COLUMNS, dtype=str, keep_default_na=False, chunksize=chunksize)
+    filtered = open(filtered_path, 'w', newline='', encoding='utf-8') if filtered_path else None
+    try:
+        with open(output_path, 'w', newline='', encoding='utf-8') as out:
+            for i, chunk in enumerate(reader):
+                pairs = extract_pairs(chunk, symbols, first_post_id=stats['posts'])
+                pairs.to_csv(out, index=False, header=(i == 0))
+                kept = pairs['PostID'].unique()
+                if filtered is not None:
+                    chunk.iloc[kept - stats['posts']][MESSAGE_COLUMNS].to_csv(filtered, index=False, header=(i == 0))
+                stats['posts'] += len(chunk)
+                stats['posts_with_symbols'] += len(kept)
+                stats['pairs'] += len(pairs)
+                print(f"Processed {stats['posts']:,} posts, {stats['pairs']:,} pairs...")
+    finally:
+        if filtered is not None:
+            filtered.close()
+    return stats
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Extract and validate cashtags from a social posts CSV')
+    parser.add_argument('input_path', help='Path to messages CSV (OwnerID, MessageText, CreateTime)')
+    parser.add_argument('--output', '-o', default=None,
+                        help='Path to output pairs CSV (default: <input>_cashtags.csv)')
+    parser.add_argument('--symbols', default=os.path.join(script_dir, 'spx_companies.json'),
+                        help='JSON file with valid symbols (default: spx_companies.json in script directory)')
+    parser.add_argument('--filtered-output', default=None,
+                        help='Also write the posts that mention a valid symbol to this CSV (optional)')
+    parser.add_argument('--chunksize', type=int, default=500000, help='Rows read per chunk (default: 500000)')
+
+    args = parser.parse_args()
+
+    try:
+        output_path = args.output or os.path.splitext(args.input_path)[0] + '_cashtags.csv'
+        start_time = time.time()
+        symbols = load_symbols(args.symbols)
+        stats = extract_cashtags(args.input_path, symbols, output_path, args.filtered_output, args.chunksize)
+        print(f"Posts: {stats['posts']:,}, with valid symbols: {stats['posts_with_symbols']:,}, pairs: {stats['pairs']:,}")
+        print(f"Pairs written to: {output_path} ({time.time() - start_time:.1f}s)")
+        if args.filtered_output:
+            print(f"Filtered posts written to: {args.filtered_output}")
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+
+if __name__ == '__main__':
+    main()
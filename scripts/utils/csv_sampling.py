@@ -0,0 +1,119 @@
+"""
+csv_sampling.py
+---------------
+Streaming row samplers for large CSV files, used by create_short_csv.py and generate_csv_samples.py.
+- head: the first n rows; reading stops as soon as they are taken
+- reservoir: a uniform random sample of n rows in one pass (Algorithm L), memory O(n)
+- stratified: up to n random rows per value of a key column (e.g. Symbol, OwnerID),
+  one reservoir per key, memory O(n x number of keys); max_keys caps the number of keys kept
+Sampled rows keep their original file order and field text.
+"""
+import csv
+import heapq
+import math
+import random
+import zlib
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+METHODS = ('head', 'reservoir', 'stratified')
+
+def _uniform(rng: random.Random) -> float:
+    """Uniform draw from the open interval (0, 1)."""
+    u = rng.random()
+    while u == 0.0:
+        u = rng.random()
+    return u
+
+def head_sample(rows: Iterable[list], n: int) -> List[list]:
+    """The first n rows."""
+    return list(islice(rows, n))
+
+def reservoir_sample(rows: Iterable[list], n: int, rng: Optional[random.Random] = None) -> List[list]:
+    """
+    Uniform sample of n rows (all rows if there are fewer) in file order.
+    Algorithm L: after the reservoir fills, jumps ahead by geometric skips, so the random
+    number generator is called O(n log(N/n)) times instead of once per row.
+    """
+    rng = rng or random.Random()
+    reservoir: List[Tuple[int, list]] = list(islice(enumerate(rows), n))
+    if len(reservoir) < n or n == 0:
+        return [row for _, row in reservoir]
+    it = enumerate(rows, start=n)
+    w = math.exp(math.log(_uniform(rng)) / n)
+    while True:
+        skip = int(math.log(_uniform(rng)) / math.log(1 - w)) if w < 1 else 0
+        item = next(islice(it, skip, None), None)
+        if item is None:
+            break
+        reservoir[rng.randrange(n)] = item
+        w *= math.exp(math.log(_uniform(rng)) / n)
+    return [row for _, row in sorted(reservoir, key=lambda item: item[0])]
+
+def stratified_sample(rows: Iterable[list], key_index: int, n: int, rng: Optional[random.Random] = None,
+                      max_keys: Optional[int] = None) -> List[list]:
+    """
+    Uniform sample of up to n rows for each distinct value in column key_index, in file order.
+    With max_keys, only a random subset of max_keys key values is kept (those with the smallest
+    seeded hash), so memory stays O(n x max_keys) however many distinct keys the file has.
+    """
+    rng = rng or random.Random()
+    salt = str(rng.getrandbits(32)).encode()
+    reservoirs: Dict[str, List[Tuple[int, list]]] = {}
+    seen: Dict[str, int] = {}
+    kept_hashes: List[Tuple[int, str]] = []  # max-heap of (-hash, key) over the kept keys
+    for i, row in enumerate(rows):
+        key = row[key_index] if key_index < len(row) else ''
+        reservoir = reservoirs.get(key)
+        if reservoir is None:
+            if max_keys is not None:
+                key_hash = zlib.crc32(salt + key.encode())
+                if len(kept_hashes) >= max_keys:
+                    if max_keys == 0 or key_hash >= -kept_hashes[0][0]:
+                        continue
+                    _, evicted = heapq.heappop(kept_hashes)
+                    del reservoirs[evicted], seen[evicted]
+                heapq.heappush(kept_hashes, (-key_hash, key))
+            reservoir = reservoirs[key] = []
+        count = seen.get(key, 0) + 1
+        seen[key] = count
+        if count <= n:
+            reservoir.append((i, row))
+        else:
+            j = rng.randrange(count)
+            if j < n:
+                reservoir[j] = (i, row)
+    sampled = [item for reservoir in reservoirs.values() for item in reservoir]
+    return [row for _, row in sorted(sampled, key=lambda item: item[0])]
+
+def sample_rows(rows: Iterable[list], header: List[str], n: int, method: str = 'head',
+                key: Optional[str] = None, seed: Optional[int] = None, max_keys: Optional[int] = None) -> List[list]:
+    """Sample data rows (after the header) with one of METHODS; key names the stratified column."""
+    rng = random.Random(seed)
+    if method == 'head':
+        return head_sample(rows, n)
+    if method == 'reservoir':
+        return reservoir_sample(rows, n, rng)
+    if method == 'stratified':
+        if key not in header:
+            raise ValueError(f"Stratified sampling needs a key column from the header {header}, got {key!r}")
+        return stratified_sample(rows, header.index(key), n, rng, max_keys)
+    raise ValueError(f"Unknown sampling method {method!r}, expected one of {METHODS}")
+
+def sample_csv(input_path: str, output_path: str, n: int, method: str = 'head',
+               key: Optional[str] = None, seed: Optional[int] = None, max_keys: Optional[int] = None) -> int:
+    """
+    Stream input_path and write its header plus the sampled rows to output_path.
+    Returns the number of rows written, not counting the header.
+    """
+    with open(input_path, 'r', encoding='utf-8', newline='') as infile:
+        reader = csv.reader(infile)
+        header = next(reader, None)
+        if header is None:
+            raise ValueError(f"{input_path} is empty")
+        sampled = sample_rows(reader, header, n, method, key, seed, max_keys)
+    with open(output_path, 'w', encoding='utf-8', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(header)
+        writer.writerows(sampled)
+    return len(sampled)
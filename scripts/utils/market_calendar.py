@@ -0,0 +1,22 @@
+"""
+market_calendar.py
+------------------
+Market-time helpers shared by the ingestion scripts.
+"""
+import pandas as pd
+
+MARKET_TIMEZONE = 'America/New_York'
+MARKET_OPEN = pd.Timedelta(hours=9, minutes=30)
+
+def effective_trading_date(create_times: pd.Series) -> pd.Series:
+    """
+    Map post timestamps to the date whose market session they can act on: the New York calendar
+    date for posts before 09:30 ET, the next day for posts at or after it.
+    Naive timestamps are taken as UTC. Works on the datetime64 values directly; DST is handled
+    by the timezone conversion. Returns midnight datetime64 dates.
+    """
+    times = pd.to_datetime(create_times, utc=True)
+    local = times.dt.tz_convert(MARKET_TIMEZONE).dt.tz_localize(None)
+    day = local.dt.normalize()
+    after_open = (local - day) >= MARKET_OPEN
+    return day + pd.to_timedelta(after_open.astype('int64'), unit='D')
@@ -0,0 +1,172 @@
+"""
+price_store.py
+--------------
+Consolidated price store: open, close and daily_gain as trading-date x symbol NumPy arrays,
+saved as .npy files in one directory and memory-mapped on load.
+Missing (date, symbol) cells are NaN.
+"""
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+STORE_VERSION = 1
+PRICE_FIELDS = ('open', 'close', 'daily_gain')
+META_FILE = 'meta.json'
+
+def is_price_store(path: str) -> bool:
+    """Return True if path is a price store directory."""
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+def meta_path(path: str) -> str:
+    """
+    Return the metadata file of a store. Its content fingerprints the store: write_price_store
+    records a digest of the array data in it alongside the dates and symbols.
+    """
+    return os.path.join(path, META_FILE)
+
+def _pivot_prices(prices_df: pd.DataFrame):
+    """Return (dates, symbols, {field: matrix}) for a long-format frame, dates and symbols sorted."""
+    dates = pd.to_datetime(prices_df['date']).to_numpy('datetime64[D]')
+    date_codes, unique_dates = pd.factorize(dates, sort=True)
+    symbol_codes, symbols = pd.factorize(prices_df['symbol'], sort=True)
+    shape = (len(unique_dates), len(symbols))
+    arrays = {}
+    for field in [f for f in PRICE_FIELDS if f in prices_df.columns]:
+        matrix = np.full(shape, np.nan)
+        matrix[date_codes, symbol_codes] = prices_df[field].to_numpy(dtype=np.float64)
+        arrays[field] = matrix
+    return np.asarray(unique_dates, dtype='datetime64[D]'), [str(s) for s in symbols], arrays
+
+def write_price_store(path: str, prices_df: pd.DataFrame) -> None:
+    """
+    Write a long-format frame with date, symbol and any of open/close/daily_gain columns as a store.
+    Rows are sorted by date and columns by symbol; the directory is replaced atomically.
+    """
+    dates, symbols, arrays = _pivot_prices(prices_df)
+    tmp_path = path.rstrip(os.sep) + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    digest = hashlib.sha256()
+    for field, matrix in arrays.items():
+        np.save(os.path.join(tmp_path, f'{field}.npy'), matrix)
+        digest.update(field.encode())
+        digest.update(matrix.tobytes())
+    meta = {
+        'version': STORE_VERSION,
+        'fields': list(arrays),
+        'dates': [str(d) for d in dates],
+        'symbols': symbols,
+        'digest': digest.hexdigest(),
+    }
+    with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+        json.dump(meta, f)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+class PriceStore:
+    """
+    Date x symbol price arrays with date and symbol indexes; see open_price_store and from_frame.
+    Rows follow `dates` (ascending datetime64[D]) and columns follow `symbols`.
+    """
+    def __init__(self, dates: np.ndarray, symbols: List[str], arrays: Dict[str, np.ndarray], path: Optional[str] = None):
+        self.path = path
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.symbols = list(symbols)
+        self.date_index = {d: i for i, d in enumerate(self.dates.tolist())}
+        self.symbol_index = {s: i for i, s in enumerate(self.symbols)}
+        self._symbol_lookup = pd.Index(self.symbols)
+        # Calendar day offset from the first date -> row (-1 on non-trading days), for array lookups
+        self._first_day = self.dates[0] if len(self.dates) else np.datetime64(0, 'D')
+        span = int((self.dates[-1] - self._first_day).astype(np.int64)) + 1 if len(self.dates) else 0
+        self._day_rows = np.full(span, -1, dtype=np.int64)
+        self._day_rows[(self.dates - self._first_day).astype(np.int64)] = np.arange(len(self.dates))
+        self.arrays = arrays
+
+    @classmethod
+    def from_frame(cls, prices_df: pd.DataFrame) -> 'PriceStore':
+        """Build an in-memory store from a long-format frame such as prices_agg.csv."""
+        return cls(*_pivot_prices(prices_df))
+
+    def get(self, field: str, date, symbol: str) -> float:
+        """O(1) lookup of one cell; NaN when the date or symbol is not in the store."""
+        row = self.date_index.get(np.datetime64(pd.Timestamp(date).date(), 'D').tolist())
+        col = self.symbol_index.get(symbol)
+        if row is None or col is None:
+            return np.nan
+        return float(self.arrays[field][row, col])
+
+    def rows_for(self, dates) -> np.ndarray:
+        """Row index of each date, -1 for dates not in the store."""
+        days = pd.to_datetime(pd.Series(dates)).to_numpy('datetime64[D]')
+        offsets = (days - self._first_day).astype(np.int64)
+        valid = (offsets >= 0) & (offsets < len(self._day_rows)) & ~np.isnat(days)
+        rows = np.full(len(days), -1, dtype=np.int64)
+        rows[valid] = self._day_rows[offsets[valid]]
+        return rows
+
+    def columns_for(self, symbols) -> np.ndarray:
+        """Column index of each symbol, -1 for symbols not in the store. Categorical input is mapped per category."""
+        symbols = pd.Series(symbols)
+        if isinstance(symbols.dtype, pd.CategoricalDtype):
+            category_cols = self._symbol_lookup.get_indexer(symbols.cat.categories.astype(object))
+            codes = symbols.cat.codes.to_numpy()
+            return np.where(codes >= 0, category_cols[codes], -1)
+        return self._symbol_lookup.get_indexer(symbols.astype(object))
+
+    def lookup(self, field: str, dates, symbols) -> np.ndarray:
+        """
+        Vectorized lookup of many (date, symbol) pairs, e.g. to join daily_gain onto a frame.
+        Returns a float64 array aligned with the inputs, NaN where the pair is not in the store.
+        """
+        rows = self.rows_for(dates)
+        cols = self.columns_for(symbols)
+        found = (rows >= 0) & (cols >= 0)
+        result = np.full(len(rows), np.nan)
+        result[found] = self.arrays[field][rows[found], cols[found]]
+        return result
+
+    def slice(self, field: str, start=None, end=None, symbols: Optional[Iterable[str]] = None):
+        """
+        Return (dates, symbols, matrix) for the rows from start through end (inclusive) and,
+        optionally, the given symbols. Without symbols the matrix is a view of the mapped array.
+        """
+        lo = 0 if start is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start).date(), 'D'))
+        hi = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end).date(), 'D'), side='right')
+        matrix = self.arrays[field][lo:hi]
+        if symbols is None:
+            return self.dates[lo:hi], list(self.symbols), matrix
+        symbols = list(symbols)
+        cols = self._symbol_lookup.get_indexer(symbols)
+        if (cols < 0).any():
+            missing = [s for s, c in zip(symbols, cols) if c < 0]
+            raise KeyError(f"Symbols not in price store: {missing}")
+        return self.dates[lo:hi], symbols, matrix[:, cols]
+
+    def to_frame(self, field: str = 'daily_gain') -> pd.DataFrame:
+        """Long-format (date, symbol, field) frame of the non-missing cells, like prices_agg.csv."""
+        matrix = np.asarray(self.arrays[field])
+        rows, cols = np.nonzero(~np.isnan(matrix))
+        return pd.DataFrame({
+            'date': pd.to_datetime(self.dates[rows]),
+            'symbol': np.asarray(self.symbols, dtype=object)[cols],
+            field: matrix[rows, cols],
+        })
+
+def open_price_store(path: str, mmap: bool = True) -> PriceStore:
+    """Open a price store written by write_price_store, memory-mapping the arrays (read-only) unless mmap=False."""
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get('version') != STORE_VERSION:
+        raise ValueError(f"Unsupported price store version in {path}: {meta.get('version')}")
+    arrays = {
+        field: np.load(os.path.join(path, f'{field}.npy'), mmap_mode='r' if mmap else None)
+        for field in meta['fields']
+    }
+    return PriceStore(meta['dates'], meta['symbols'], arrays, path=path)
@@ -1,57 +1,163 @@
+"""
+check_csv_fields.py
+-------------------
+Checks that every record of a CSV file has the expected number of fields and reports the
+malformed ones with their line number and byte offset. Quoted fields may contain commas,
+escaped quotes ("") and newlines.
+
+The file is memory-mapped and split into byte ranges that are checked in parallel:
+1. Each range counts its '"' bytes. The running parity tells whether a range starts inside
+   a quoted field, so every range start is moved forward to the next record boundary.
+2. Each aligned range is checked with NumPy: a comma or newline is a separator only where
+   the number of quotes before it is even.
+With --output, the header and the valid records are written to a cleaned file.
+"""
+import argparse
+import mmap
+import os
+import shutil
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+QUOTE, COMMA, NEWLINE, CR = ord('"'), ord(','), ord('\n'), ord('\r')
+RANGE_SIZE = 32 * 1024 * 1024
 
-def parse_csv_line(line):
-    result = []
-    if line is None:
-        return result
-    i = 0
-    length = len(line)
-    while i < length:
-        if line[i] == '"':
-            i += 1  # skip opening quote
-            sb = []
-            in_quotes = True
-            while i < length and in_quotes:
-                if line[i] == '"':
-                    if i + 1 < length and line[i + 1] == '"':
-                        sb.append('"')
-                        i += 2
-                    else:
-                        in_quotes = False
-                        i += 1
-                else:
-                    sb.append(line[i])
-                    i += 1
-            # Skip comma after quoted field
-            while i < length and line[i] != ',':
-                i += 1
-            if i < length and line[i] == ',':
-                i += 1
-            result.append(''.join(sb))
-        else:
-            start = i
-            while i < length and line[i] != ',':
-                i += 1
-            result.append(line[start:i])
-            if i < length and line[i] == ',':
-                i += 1
-    return result
-
-if len(sys.argv) < 2:
-    print("Usage: python check_csv_fields.py <csvfile> [expected_fields]")
-    sys.exit(1)
-
-csvfile = sys.argv[1]
-expected_fields = int(sys.argv[2]) if len(sys.argv) > 2 else 3
-
-with open(csvfile, encoding='utf-8') as f:
-    header = f.readline()
-    line_num = 1
-    for line in f:
-        line_num += 1
-        line = line.strip()
-        if not line:
+def count_quotes(path, start, end):
+    """Number of '"' bytes in [start, end)."""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return mm[start:end].count(b'"')
+
+def next_record_start(mm, pos, in_quotes):
+    """First record start at or after pos, given whether pos is inside a quoted field."""
+    size = len(mm)
+    while pos < size:
+        if in_quotes:
+            quote = mm.find(b'"', pos)
+            if quote == -1:
+                return size
+            pos, in_quotes = quote + 1, False
             continue
-        fields = parse_csv_line(line)
-        if len(fields) != expected_fields:
-            print(f"Line {line_num}: {len(fields)} fields: {line}")
+        newline = mm.find(b'\n', pos)
+        quote = mm.find(b'"', pos, newline if newline != -1 else size)
+        if quote == -1:
+            return size if newline == -1 else newline + 1
+        pos, in_quotes = quote + 1, True
+    return size
+
+def aligned_ranges(path, mm, header_end, workers):
+    """Split [header_end, size) into byte ranges that start and end on record boundaries."""
+    size = len(mm)
+    count = max(workers, -(-(size - header_end) // RANGE_SIZE), 1)
+    step = -(-(size - header_end) // count)
+    raw_starts = list(range(header_end, size, step)) if size > header_end else []
+    raw_ends = raw_starts[1:] + [size]
+    quotes = run_parallel(count_quotes, [(path, s, e) for s, e in zip(raw_starts, raw_ends)], workers)
+    starts, parity = [], 0
+    for raw_start, n in zip(raw_starts, quotes):
+        start = raw_start if raw_start == header_end else next_record_start(mm, raw_start, parity % 2 == 1)
+        if start < size and (not starts or start > starts[-1]):
+            starts.append(start)
+        parity += n
+    return list(zip(starts, starts[1:] + [size]))
+
+def check_range(path, start, end, expected_fields, part_path=None):
+    """
+    Check the records in [start, end), which must start on a record boundary.
+    Returns (newline count, malformed records as (relative line, byte offset, fields, raw bytes)).
+    With part_path, the valid non-blank records are written there.
+    """
+    # Imported here so --help and the range alignment do not pay for NumPy
+    import numpy as np
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = mm[start:end]
+    a = np.frombuffer(data, dtype=np.uint8)
+    quotes = np.flatnonzero(a == QUOTE)
+    newlines = np.flatnonzero(a == NEWLINE)
+    commas = np.flatnonzero(a == COMMA)
+    # Separators are the commas and newlines preceded by an even number of quotes
+    record_ends = newlines[np.searchsorted(quotes, newlines) % 2 == 0]
+    field_commas = commas[np.searchsorted(quotes, commas) % 2 == 0]
+    if len(record_ends) == 0 or record_ends[-1] != len(a) - 1:
+        record_ends = np.append(record_ends, len(a))  # last record without a trailing newline
+    record_starts = np.concatenate(([0], record_ends[:-1] + 1))
+    fields = np.searchsorted(field_commas, record_ends) - np.searchsorted(field_commas, record_starts) + 1
+    # Blank lines ("" or "\r") are skipped
+    lengths = record_ends - record_starts
+    last = np.minimum(record_starts, len(a) - 1)
+    blank = (lengths == 0) | ((lengths == 1) & (a[last] == CR))
+    bad = np.flatnonzero((fields != expected_fields) & ~blank)
+    lines = np.searchsorted(newlines, record_starts[bad])
+
+    malformed = [
+        (int(line), start + int(record_starts[i]), int(fields[i]), data[record_starts[i]:record_ends[i]].rstrip(b'\r'))
+        for i, line in zip(bad, lines)
+    ]
+    if part_path is not None:
+        with open(part_path, 'wb') as out:
+            pos = 0
+            for i in np.flatnonzero((fields != expected_fields) | blank):
+                out.write(data[pos:record_starts[i]])
+                pos = min(record_ends[i] + 1, len(data))
+            out.write(data[pos:])
+    return len(newlines), malformed
+
+def run_parallel(func, arg_tuples, workers):
+    """Apply func to each argument tuple, in a process pool when workers > 1; results in order."""
+    if workers > 1 and len(arg_tuples) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(func, *zip(*arg_tuples)))
+    return [func(*args) for args in arg_tuples]
+
+def check_csv(path, expected_fields, workers=1, output_path=None):
+    """
+    Check every record after the header. Yields (line number, byte offset, fields, raw bytes) for
+    each malformed record, in file order. With output_path, writes the header and the valid
+    records there, dropping blank lines.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header_end = next_record_start(mm, 0, False)
+            header = mm[:header_end]
+            ranges = aligned_ranges(path, mm, header_end, workers)
+
+    part_paths = [f"{output_path}.part{i}" if output_path else None for i in range(len(ranges))]
+    results = run_parallel(check_range, [(path, s, e, expected_fields, p) for (s, e), p in zip(ranges, part_paths)], workers)
+    line_base = 1 + header.count(b'\n')
+    for newline_count, malformed in results:
+        for line, offset, fields, record in malformed:
+            yield line_base + line, offset, fields, record
+        line_base += newline_count
+
+    if output_path:
+        with open(output_path, 'wb') as out:
+            out.write(header)
+            for part_path in part_paths:
+                with open(part_path, 'rb') as part:
+                    shutil.copyfileobj(part, out)
+                os.remove(part_path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that every CSV record has the expected number of fields')
+    parser.add_argument('csvfile', help='CSV file to check; the first record is the header')
+    parser.add_argument('expected_fields', nargs='?', type=int, default=3, help='Expected number of fields (default: 3)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Number of processes checking byte ranges in parallel (default: CPU count)')
+    parser.add_argument('--output', type=str, default=None, help='Write the header and the valid records to this file')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    bad_records = 0
+    for line, offset, fields, record in check_csv(args.csvfile, args.expected_fields, args.workers, args.output):
+        bad_records += 1
+        print(f"Line {line} (byte {offset}): {fields} fields: {record.decode('utf-8', errors='replace')}")
+    size_mb = os.path.getsize(args.csvfile) / 1e6
+    elapsed = time.time() - start_time
+    print(f"Checked {size_mb:,.1f} MB in {elapsed:.1f}s, {bad_records:,} malformed records", file=sys.stderr)
+    if args.output:
+        print(f"Valid records written to: {args.output}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()